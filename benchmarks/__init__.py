@@ -0,0 +1,3 @@
+"""
+This package contains scripts that measure the performance of the converter on synthetic studies.
+"""
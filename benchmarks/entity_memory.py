@@ -0,0 +1,99 @@
+"""
+Benchmark of the memory held by the BIDS entities of a synthetic project, shaped like the output of the generator
+
+Usage: python -m benchmarks.entity_memory [-r N] [-s N] [-c N]
+
+Options:
+    -r, --runs: Number of runs (scans) of the project
+    -s, --sessions: Number of runs of each session
+    -c, --channels: Number of channels of the recording parameter set shared by every scan
+"""
+
+import argparse
+import gc
+import tracemalloc
+
+from structure.subject import BIDSSubject, BIDSSession, BIDSScan
+from structure.tables import SharedTable
+
+
+def build_sessions(count, electrodes):
+    """
+    Builds sessions holding the same entries as the sessions created by the generator, without their scans
+
+    :param count: Number of sessions
+    :param electrodes: SharedTable of electrodes, shared by every session
+    :return: List of BIDSSessions
+    """
+    sessions = list()
+    for i in range(count):
+        session = BIDSSession()
+        session.fields['acq_time'] = "2019-01-01T00:00:%02d" % (i % 60)
+        session.fields['ESS_subjectLabID'] = "S%d" % i
+        session.fields['ESS_sessionNum'] = str(i + 1)
+        session.fields['legacy_recordingParameterSet'] = "RPS_A"
+        session.field_definitions['ESS_dataRecordingUuid'] = {"Description": "UUID of the data recording"}
+        session.field_definitions['ESS_inSessionRecordingNum'] = {"Description": "Number of the recording"}
+        session.coordsystem = {'EEGCoordinateSystem': 'RAS', 'EEGCoordinateUnits': 'mm'}
+        session.electrodes = electrodes
+        sessions.append(session)
+    return sessions
+
+
+def build_scans(count, channels):
+    """
+    Builds scans holding the same entries as the scans created by the generator, without their events
+
+    :param count: Number of scans
+    :param channels: SharedTable of channels, shared by every scan
+    :return: List of BIDSScans
+    """
+    scans = list()
+    for i in range(count):
+        scan = BIDSScan("/ess/session/%d/recording_%d.set" % (i, i), "restingState")
+        scan.run = i % 4 + 1
+        scan.fields['ESS_dataRecordingUuid'] = "%032x" % i
+        scan.fields['ESS_inSessionRecordingNum'] = str(i % 4 + 1)
+        scan.channels = channels
+        scans.append(scan)
+    return scans
+
+
+def measure(build, *args):
+    """
+    :return: Tuple of the entities built by build(*args), and the number of bytes they hold
+    """
+    gc.collect()
+    start = tracemalloc.get_traced_memory()[0]
+    entities = build(*args)
+    gc.collect()
+    return entities, tracemalloc.get_traced_memory()[0] - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-r', '--runs', type=int, default=10000, help="number of runs of the project")
+    parser.add_argument('-s', '--sessions', type=int, default=4, help="number of runs of each session")
+    parser.add_argument('-c', '--channels', type=int, default=64, help="number of channels of every scan")
+    args = parser.parse_args()
+
+    channels = SharedTable({"E%d" % i: {'type': 'EEG', 'units': 'uV', 'sampling_frequency': '256'}
+                            for i in range(args.channels)})
+    electrodes = SharedTable({"E%d" % i: {'x': 0.0, 'y': 0.0, 'z': 0.0} for i in range(args.channels)})
+    session_count = max(args.runs // max(args.sessions, 1), 1)
+
+    tracemalloc.start()
+    subjects, subject_bytes = measure(lambda count: [BIDSSubject() for _ in range(count)], session_count)
+    sessions, session_bytes = measure(build_sessions, session_count, electrodes)
+    scans, scan_bytes = measure(build_scans, args.runs, channels)
+    tracemalloc.stop()
+
+    print(f"{len(subjects)} subjects, {len(sessions)} sessions, {len(scans)} scans")
+    print(f"{'entity':>8} {'bytes each':>11} {'total MB':>9}")
+    for name, count, size in (('subject', len(subjects), subject_bytes), ('session', len(sessions), session_bytes),
+                              ('scan', len(scans), scan_bytes)):
+        print(f"{name:>8} {size / count:>11.0f} {size / 1024 / 1024:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
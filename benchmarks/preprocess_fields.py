@@ -0,0 +1,72 @@
+"""
+Benchmark of BIDSTask.preprocess_fields() on synthetic tasks of growing size
+
+Usage: python -m benchmarks.preprocess_fields [-f N] [-r N] [sizes ...]
+
+Options:
+    -f, --fields: Number of fields specified for every scan
+    -r, --repeat: Number of times each size is measured, the fastest time being reported
+
+Positional Arguments:
+    sizes: Sizes of the synthetic tasks, each given as <subjects>x<sessions>x<runs>
+"""
+
+import argparse
+import time
+
+from structure.task import BIDSTask
+
+default_sizes = ['10x2x4', '30x2x4', '100x2x4', '300x2x4', '300x4x8']
+
+
+def build_task(subjects, sessions, runs, fields):
+    """
+    Builds a task the way the generator does, every field being specified for every scan
+
+    * One in four fields has the same value everywhere, one in four differs between subjects, one in four differs
+      between sessions, and the others differ between runs, so every level of consolidation is exercised
+
+    :param subjects: Number of subjects
+    :param sessions: Number of sessions of each subject
+    :param runs: Number of runs of each session
+    :param fields: Number of fields of each scan
+    :return: BIDSTask
+    """
+    task = BIDSTask()
+    task.add_field("TaskName", "benchmark")
+    for subject in range(subjects):
+        subject_label = "%03d" % (subject + 1)
+        for session in range(sessions):
+            session_label = "%02d" % (session + 1)
+            for run in range(runs):
+                scan_name = "eeg/sub-%s_ses-%s_task-benchmark_run-%d_eeg.set" % (subject_label, session_label, run + 1)
+                for field in range(fields):
+                    value = (0, subject, (subject, session), (subject, session, run))[field % 4]
+                    task.add_field("Field%02d" % field, str(value), subject_label=subject_label,
+                                   session_label=session_label, scan_name=scan_name)
+    return task
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('sizes', nargs='*', default=default_sizes, help="<subjects>x<sessions>x<runs>")
+    parser.add_argument('-f', '--fields', type=int, default=12, help="number of fields specified for every scan")
+    parser.add_argument('-r', '--repeat', type=int, default=3, help="number of measurements of each size")
+    args = parser.parse_args()
+
+    print(f"{'subjects':>8} {'sessions':>8} {'runs':>5} {'fields':>6} {'entries':>9} {'seconds':>9} {'us/entry':>9}")
+    for size in args.sizes:
+        subjects, sessions, runs = (int(n) for n in size.split('x'))
+        entries = subjects * sessions * runs * args.fields
+        elapsed = None
+        for _ in range(max(args.repeat, 1)):
+            task = build_task(subjects, sessions, runs, args.fields)
+            start = time.perf_counter()
+            task.preprocess_fields()
+            elapsed = min(elapsed or float('inf'), time.perf_counter() - start)
+        print(f"{subjects:>8} {sessions:>8} {runs:>5} {args.fields:>6} {entries:>9} {elapsed:>9.4f} "
+              f"{elapsed / entries * 1e6:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
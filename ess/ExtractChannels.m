@@ -6,7 +6,7 @@ chanlocs = EEG.chanlocs;
 
 labels = {chanlocs.labels};
 type = {chanlocs.type};
-chaninfo = {EEG.chaninfo}
+chaninfo = {EEG.chaninfo};
 
 X = cellfun(@double, {chanlocs.X}, 'UniformOutput', false);
 Y = cellfun(@double, {chanlocs.Y}, 'UniformOutput', false);
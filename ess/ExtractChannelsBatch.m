@@ -0,0 +1,13 @@
+function [labels, type, X, Y, Z] = ExtractChannelsBatch(filenames, paths)
+% Extracts the channels of several recordings in a single call, see ExtractChannels.
+% Each output is a cell array with one entry per recording, holding that recording's ExtractChannels output.
+
+labels = cell(1, numel(filenames));
+type = cell(1, numel(filenames));
+X = cell(1, numel(filenames));
+Y = cell(1, numel(filenames));
+Z = cell(1, numel(filenames));
+
+for i = 1:numel(filenames)
+    [labels{i}, type{i}, X{i}, Y{i}, Z{i}] = ExtractChannels(filenames{i}, paths{i});
+end
@@ -8,7 +8,6 @@ to be changed in order for the output BIDS study to be considered BIDS compliant
 __all__ = ["generate_bids_project", "generate_report", "LXMLDecodeError"]
 
 import datetime
-import io
 import re
 import os.path
 
@@ -16,27 +15,29 @@ from ess.definitions import *
 from structure.project import BIDSProject, channel_types
 from structure.task import BIDSTask
 from structure.subject import BIDSSession, BIDSScan, BIDSSubject
+from structure.tables import index_rows
+from ess.events import read_event_instances
 from xml_extractor.deprecated.ess2obj import *
 # from xml_extractor.ess2obj import extract_description
 from xml_extractor.deprecated.obj2json import *
-from utilities.matlab_instance import get_matlab_instance
+from utilities.extractors import MatlabChannelExtractor
 
 DISPLAY_VALS = None
-DISPLAY_MATLAB_OUTPUT = None
 
 
-def generate_bids_project(input_directory, verbose=False) -> BIDSProject:
+def generate_bids_project(input_directory, verbose=False, channel_extractor=None) -> BIDSProject:
     """
     Converts an ESS structure into a BIDSProject
 
     :param input_directory: Source filepath for a given ESS study
     :param verbose: If set to True, additional logging is provided to standard output
+    :param channel_extractor: ChannelExtractor used to extract the channels of each recording. If not specified,
+                              channels are extracted through the Matlab engines started by create_matlab_instance()
     :return: BIDSProject object mapped from ESS file structure
     """
 
-    global DISPLAY_MATLAB_OUTPUT, DISPLAY_VALS
+    global DISPLAY_VALS
 
-    DISPLAY_MATLAB_OUTPUT = verbose
     DISPLAY_VALS = verbose
 
     # try:
@@ -44,12 +45,13 @@ def generate_bids_project(input_directory, verbose=False) -> BIDSProject:
     # except Exception as e:
     #     raise LXMLDecodeError(input_directory, e)
 
+    # 'study_description.xml' is parsed once, and converted to the object model once, for every stage below
     try:
-        header_dict = xml2head(os.path.join(input_directory, "study_description.xml")).todict()
+        xml_root = parse_description(os.path.join(input_directory, "study_description.xml"))
     except IOError:
         try:
             input_directory = os.path.join(input_directory, "Level1/")
-            header_dict = xml2head(os.path.join(input_directory, "study_description.xml")).todict()
+            xml_root = parse_description(os.path.join(input_directory, "study_description.xml"))
         except (IOError, OSError):
             raise IOError("ESS project directory doesn't contain 'study_description.xml'")
         except Exception as e:
@@ -57,6 +59,18 @@ def generate_bids_project(input_directory, verbose=False) -> BIDSProject:
     except Exception as e:
         raise LXMLDecodeError(input_directory, e)
 
+    try:
+        header_dict = xml2head(xml_root).todict()
+        description = {
+            'sessions': sessionlist2dict(xml2sessionlist(xml_root)),
+            'rec_parameter_sets': xml2recparamsetlist(xml_root),
+            'tasks': tasklist2dict(xml2tasklist(xml_root)),
+            'event_codes': eventcodelist2dict(xml2eventcodelist(xml_root))
+        }
+    except Exception as e:
+        raise LXMLDecodeError(input_directory, e)
+    del xml_root
+
     bids_file = BIDSProject(os.path.basename(input_directory))
     bids_file.init_dataset_description(header_dict['Title'], header_dict['Study License'],
                                        funding=[header_dict['Funding Organization'],])
@@ -64,16 +78,14 @@ def generate_bids_project(input_directory, verbose=False) -> BIDSProject:
     bids_file.readme = f"Description: {header_dict['Description']}\nLegacy UUID: {header_dict['UUID']}\n"
     bids_file.changes = "1.0.0 - %s\n - Initial Release" % datetime.date.today()
 
-    print("Reading project %s..." % input_directory)
-    _generate_bids_sessions(bids_file, input_directory)
-    _generate_bids_tasks(bids_file, input_directory)
+    if channel_extractor is None:
+        channel_extractor = MatlabChannelExtractor(verbose=verbose)
 
-    try:
-        event_codes = eventcodelist2dict(xml2eventcodelist(os.path.join(input_directory, "study_description.xml")))
-    except Exception as e:
-        raise LXMLDecodeError(input_directory, e)
+    print("Reading project %s..." % input_directory)
+    _generate_bids_sessions(bids_file, description, input_directory, channel_extractor)
+    _generate_bids_tasks(bids_file, description)
 
-    for event_code in event_codes.values():
+    for event_code in description['event_codes'].values():
         if event_code['No. instances'] == 0:
             pass
         elif event_code['Task Label'] and bids_file.tasks[underscore_to_camelcase(event_code['Task Label'])]:
@@ -106,8 +118,7 @@ def generate_report(bids_file: BIDSProject) -> str:
                 warnings_list.append(
                     "Warning: session %s specifies electrodes, but no coordinate system" % session_name)
             for filename, scan in session.scans.items():
-                if list(session.electrodes.keys()) != list(
-                        filter(lambda x: scan.channels[x]['type'] == 'EEG', scan.channels.keys())):
+                if list(session.electrodes.keys()) != list(index_rows(scan.channels, 'type').get('EEG', ())):
                     warnings_list.append(
                         "Warning: session %s has mismatched electrodes with %s" % (session_name, filename))
 
@@ -122,27 +133,28 @@ def generate_report(bids_file: BIDSProject) -> str:
     return report
 
 
-def _generate_bids_sessions(bids_file, input_directory):
+def _generate_bids_sessions(bids_file, description, input_directory, channel_extractor):
     """
     Internal function used to pick apart each session of a given ESS study, and map it to BIDS
 
     :param bids_file: BIDSProject, which fields are changed in place
+    :param description: Sessions, recording parameter sets, tasks and event codes of 'study_description.xml'
     :param input_directory: Source filepath for a given ESS study
+    :param channel_extractor: ChannelExtractor used to extract channels, see generate_bids_project()
     :return:
     """
-    try:
-        master = sessionlist2dict(xml2sessionlist(os.path.join(input_directory, "study_description.xml")))
-    except Exception as e:
-        raise LXMLDecodeError(input_directory, e)
+    master = description['sessions']
+    rec_parameter_sets = description['rec_parameter_sets']
+
+    # recording parameter sets are only converted to dictionaries once
+    rps_dicts = [ps.todict() for ps in rec_parameter_sets]
+    rps_modalities = {ps.recordingparametersetlabel: ps.modalitylist2dict() for ps in rec_parameter_sets}
 
     subject_num = 0
     subject_dict = dict()
     RPS_electrodes = dict()
     session_numbers = dict()
 
-    matlab_out = io.StringIO()
-    matlab_err = io.StringIO()
-
     for session_key, session_parent in master.items():
         for session in session_parent:
             task_name = underscore_to_camelcase(str(session['Task Label']))
@@ -226,11 +238,6 @@ def _generate_bids_sessions(bids_file, input_directory):
                     session_id = session_numbers[session['Number']]
 
 
-                try:
-                    rec_parameter_sets = xml2recparamsetlist(os.path.join(input_directory, "study_description.xml"))
-                except Exception as e:
-                    raise LXMLDecodeError(input_directory, e)
-
                 for run_key, run in session['Data Recordings'].items():
                     current_ses_dir = os.path.join(input_directory, "session", session['Number'])
 
@@ -243,28 +250,9 @@ def _generate_bids_sessions(bids_file, input_directory):
                     bids_file.subjects[subject_id].sessions[session_id].scans[current_label].fields['ESS_inSessionRecordingNum'] = run['Filename'][run['Filename'].rfind('_') + 1:run['Filename'].rfind('.')]
 
                     try:
-                        f = open(os.path.join(current_ses_dir, run['Event Instance File']), "r")
-
-                        for line in f.readlines():
-                            tokens = line.strip('\n').split('\t')
-                            tags = None
-
-                            if tokens[0] in bids_file.event_codes:
-                                tags = tokens[2].replace(bids_file.event_codes[tokens[0]], '')
-                            else:
-                                for tl, task in bids_file.tasks.items():
-                                    if tl == tokens[0]:
-                                        tags = tokens[2].replace(task.event_codes, '')
-                                        break
-
-                            bids_file.subjects[subject_id].sessions[session_id].scans[current_label].events.append(
-                                {'onset': tokens[1], 'duration': 'n/a', 'event_code': tokens[0]})
-
-                            if tags:
-                                bids_file.subjects[subject_id].sessions[session_id].scans[
-                                    current_label].events[-1]['HED'] = tags
-
-                        f.close()
+                        bids_file.subjects[subject_id].sessions[session_id].scans[current_label].events = \
+                            read_event_instances(os.path.join(current_ses_dir, run['Event Instance File']),
+                                                 bids_file.event_codes)
                     except OSError as e:
                         print("Event instance file %s unavailable." % run['Event Instance File'])
                         raise e
@@ -273,11 +261,10 @@ def _generate_bids_sessions(bids_file, input_directory):
                         if run['Recording Parameter Set Label'] not in RPS_electrodes.keys():
                             print("Extracting electrode set from %s..." % run['Recording Parameter Set Label'])
 
-                            rps_entry = get_matlab_instance().ExtractChannels(run['Filename'], current_ses_dir, nargout=5,
-                                                                      stdout=matlab_out, stderr=matlab_err)
-                            if DISPLAY_MATLAB_OUTPUT:
-                                print(matlab_out.getvalue())
-                                print(matlab_err.getvalue())
+                            rps_entry = channel_extractor.extract(
+                                {run['Recording Parameter Set Label']: (run['Filename'], current_ses_dir)},
+                                rps_modalities
+                            )[run['Recording Parameter Set Label']]
 
                             new_rps_entry = list()
                             for i in range(6):
@@ -306,7 +293,7 @@ def _generate_bids_sessions(bids_file, input_directory):
                         for i in range(0, len(rps_entry[0])):
                             bids_file.subjects[subject_id].sessions[session_id].electrodes[rps_entry[0][i]] = {'x': rps_entry[2][i], 'y': rps_entry[3][i], 'z': rps_entry[4][i]}
 
-                    for parameter_set in [ps.todict() for ps in rec_parameter_sets if ps.todict()['Recording Parameter Set Label'] == run['Recording Parameter Set Label']]:
+                    for parameter_set in [ps for ps in rps_dicts if ps['Recording Parameter Set Label'] == run['Recording Parameter Set Label']]:
                         for modality in parameter_set['Channel Types'].keys():
                             mode = parameter_set['Channel Types'][modality]
                             modality = modality.upper()
@@ -353,19 +340,16 @@ def _generate_bids_sessions(bids_file, input_directory):
                                 # stubbed, since all channels have the same reference, so this only goes in the sidecar...channels_dict[channel]['reference'] = mode['Reference Label']
 
 
-def _generate_bids_tasks(bids_file, input_directory):
+def _generate_bids_tasks(bids_file, description):
     """
     Internal function use to pick apart task references in 'study_description.xml'
 
     :param bids_file: BIDSProject, which fields are changed in place
-    :param input_directory: Source filepath for a given ESS study
+    :param description: Sessions, recording parameter sets, tasks and event codes of 'study_description.xml'
     :return:
     """
-    try:
-        rec_parameter_sets = xml2recparamsetlist(os.path.join(input_directory, "study_description.xml"))
-        bids_tasks = tasklist2dict(xml2tasklist(os.path.join(input_directory, "study_description.xml")))
-    except Exception as e:
-        raise LXMLDecodeError(input_directory, e)
+    rps_labels = [ps.todict()['Recording Parameter Set Label'] for ps in description['rec_parameter_sets']]
+    bids_tasks = description['tasks']
 
     for task in bids_tasks.keys():
         new_task_name = underscore_to_camelcase(bids_tasks[task]['Task Label'])
@@ -375,10 +359,10 @@ def _generate_bids_tasks(bids_file, input_directory):
         bids_file.tasks[new_task_name].add_field('TaskDescription', bids_tasks[task]['Description'])
 
         bids_file.field_replacements['tasks'][new_task_name] = list()
-        for rec_parameter_set in rec_parameter_sets:
+        for rps_label in rps_labels:
             bids_file.field_replacements['tasks'][new_task_name].append(
                 {'where': {
-                    'legacy_recordingParameterSet':rec_parameter_set.todict()['Recording Parameter Set Label']
+                    'legacy_recordingParameterSet': rps_label
                 }, 'PowerLineFrequency': None}
             )
 
@@ -0,0 +1,121 @@
+"""
+This module reads the event instance files of an ESS study
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from structure.events import BIDSEvents
+
+__all__ = ['EventCodeResolver', 'read_event_instances', 'prefetch_event_instances', 'event_reader_threads']
+
+# number of event instance files read concurrently. reads are mostly bound by the latency of the storage
+# (e.g. a network share), rather than by its bandwidth
+event_reader_threads = 8
+
+# values of event code fields that were left empty, after being scrubbed by extract_description()
+_missing_tags = (None, '', 'n/a', 'NA', 'NaN')
+
+
+class EventCodeResolver:
+    """
+    Index of the HED tags shared by every event of an event code, built once per study
+
+    * Event codes without a task label apply to every task, and take precedence over task specific event codes
+    * Event codes that have no instances are left out, as they never occur in an event instance file
+
+    Attributes:
+        global_codes: dictionary of event codes shared by every task, each mapped to its HED tags
+        task_codes: dictionary of task labels, each mapped to a dictionary of its event codes and their HED tags
+    """
+
+    def __init__(self, event_codes, task_label=None):
+        """
+        :param event_codes: List of event codes, as extracted by xml_extractor.ess2obj.extract_description()
+        :param task_label: Function used to map the task label of an event code to the label of its BIDSTask
+        """
+        self.global_codes = dict()
+        self.task_codes = dict()
+        self._resolved = dict()
+
+        for event_code in event_codes:
+            if event_code['No. instances'] == 0:
+                continue
+            tags = event_code['HED Tag'] if event_code['HED Tag'] not in _missing_tags else ''
+            if event_code['Task Label'] not in _missing_tags:
+                label = task_label(event_code['Task Label']) if task_label else event_code['Task Label']
+                self.task_codes.setdefault(label, dict())[event_code['Code']] = tags
+            else:
+                self.global_codes[event_code['Code']] = tags
+
+    def for_task(self, task_label):
+        """
+        Resolves the event codes of a task
+
+        :param task_label: Label of the task
+        :return: Dictionary of event codes, each mapped to its HED tags, which must not be modified
+        """
+        if task_label not in self._resolved:
+            self._resolved[task_label] = {**self.task_codes.get(task_label, dict()), **self.global_codes}
+        return self._resolved[task_label]
+
+
+def read_event_instances(path, event_codes=None):
+    """
+    Reads an ESS event instance file into BIDSEvents, one line at a time
+
+    * Each line holds an event code, the onset of the event in seconds, and its HED tags, separated by tabs
+    * If the event code is in event_codes, the HED tags of the event code are stripped from the tags of the event,
+      and whatever tags remain (without leading or trailing separators) are kept. Otherwise, the event has no tags
+    * Empty lines are skipped
+    * The tags of an event are only resolved once for every distinct event code and tags, since most events of an
+      event code share the same tags
+
+    :raises OSError: if the event instance file can't be read
+
+    :param path: Path of the event instance file
+    :param event_codes: Dictionary of event codes, each mapped to the HED tags shared by all of its events,
+                        see EventCodeResolver.for_task()
+    :return: BIDSEvents holding every event of the file
+    """
+    events = BIDSEvents()
+    resolved = dict()
+    if event_codes is None:
+        event_codes = dict()
+
+    with open(path, 'r') as f:
+        for line in f:
+            tokens = line.strip('\n').split('\t')
+            if len(tokens) < 2:
+                continue
+
+            key = (tokens[0], tokens[2] if len(tokens) > 2 else '')
+            if key not in resolved:
+                resolved[key] = None
+                if key[0] in event_codes:
+                    resolved[key] = key[1].replace(event_codes[key[0]], '').strip(', ') or None
+
+            events.append(tokens[1], tokens[0], resolved[key])
+
+    return events
+
+
+def prefetch_event_instances(requests, event_resolver, max_workers=event_reader_threads):
+    """
+    Starts reading several event instance files concurrently in background threads, and returns immediately
+
+    * Each (path, task label) pair is only read once, even if several recordings refer to it
+    * Any error reading a file, such as an OSError, is raised once the result of its future is fetched
+
+    :param requests: Iterable of (path, task label) pairs
+    :param event_resolver: EventCodeResolver used to resolve the HED tags of the events of each task
+    :param max_workers: Maximum number of files read at the same time
+    :return: Dictionary of (path, task label) pairs, each mapped to a Future of the BIDSEvents of the file
+    """
+    futures = dict()
+    executor = ThreadPoolExecutor(max_workers=max(max_workers, 1))
+    for path, task_label in requests:
+        if (path, task_label) not in futures:
+            futures[(path, task_label)] = executor.submit(read_event_instances, path,
+                                                          event_resolver.for_task(task_label))
+    executor.shutdown(wait=False)
+    return futures
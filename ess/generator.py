@@ -8,41 +8,55 @@ to be changed in order for the output BIDS study to be considered BIDS compliant
 __all__ = ["generate_bids_project", "generate_report", "LXMLDecodeError"]
 
 import datetime
-import io
+import hashlib
 import re
 import os.path
 
+from lxml import etree
+
 from ess.definitions import *
 from structure.project import BIDSProject, channel_types
 from structure.task import BIDSTask
 from structure.subject import BIDSSession, BIDSScan, BIDSSubject
-from xml_extractor.ess2obj import extract_description
-from utilities.matlab_instance import get_matlab_instance
+from structure.tables import SharedTable, index_rows
+from ess.events import EventCodeResolver, prefetch_event_instances
+from ess.manifest import fingerprint_sessions
+from ess.replacer import open_repaired
+from xml_extractor.ess2obj import extract_description, extractor_version
+from utilities.extractors import MatlabChannelExtractor
 
 DISPLAY_VALS = None
-DISPLAY_MATLAB_OUTPUT = None
 
 
-def generate_bids_project(input_directory, verbose=False) -> BIDSProject:
+def generate_bids_project(input_directory, verbose=False, channel_extractor=None,
+                          channel_cache=None, description_cache=None, manifest=None) -> BIDSProject:
     """
     Converts an ESS structure into a BIDSProject
 
     :param input_directory: Source filepath for a given ESS study
     :param verbose: If set to True, additional logging is provided to standard output
+    :param channel_extractor: ChannelExtractor used to extract the channels of each recording. If not specified,
+                              channels are extracted through the Matlab engines started by create_matlab_instance()
+    :param channel_cache: If specified, a DiskCache used to reuse channels extracted in previous runs
+    :param description_cache: If specified, a DiskCache used to reuse 'study_description.xml' files parsed in
+                              previous runs
+    :param manifest: If specified, the SourceManifest of a previous conversion. Its subject and session labels are
+                     reused, the events of sessions whose input didn't change aren't read, and the manifest is
+                     updated in place with the sessions that changed. The project's source_manifest is set to it
     :return: BIDSProject object mapped from ESS file structure
     """
 
-    global DISPLAY_MATLAB_OUTPUT, DISPLAY_VALS
+    global DISPLAY_VALS
 
-    DISPLAY_MATLAB_OUTPUT = verbose
     DISPLAY_VALS = verbose
 
     try:
-        full_xml = extract_description(os.path.join(input_directory, "study_description.xml"))
+        full_xml = _extract_description(os.path.join(input_directory, "study_description.xml"), description_cache)
     except IOError:
         try:
             input_directory = os.path.join(input_directory, "Level1/")
-            full_xml = extract_description(os.path.join(input_directory, "study_description.xml"))
+            full_xml = _extract_description(os.path.join(input_directory, "study_description.xml"),
+                                            description_cache)
         except (IOError, OSError):
             raise IOError("ESS project directory doesn't contain 'study_description.xml'")
         except Exception as e:
@@ -59,8 +73,11 @@ def generate_bids_project(input_directory, verbose=False) -> BIDSProject:
     bids_file.readme = f"Description: {header['Description']}\nLegacy UUID: {header['UUID']}\n"
     bids_file.changes = "1.0.0 - %s\n - Initial Release" % datetime.date.today()
 
+    if channel_extractor is None:
+        channel_extractor = MatlabChannelExtractor(verbose=verbose)
+
     print("Reading project %s..." % input_directory)
-    _generate_bids_sessions(bids_file, full_xml, input_directory)
+    _generate_bids_sessions(bids_file, full_xml, input_directory, channel_extractor, channel_cache, manifest)
     _generate_bids_tasks(bids_file, full_xml)
 
     for event_code in full_xml['event_codes']:
@@ -78,6 +95,45 @@ def generate_bids_project(input_directory, verbose=False) -> BIDSProject:
     return bids_file
 
 
+def _extract_description(xml_path, description_cache=None):
+    """
+    Internal function used to extract 'study_description.xml', reusing a previous extraction of the same contents
+
+    * Cached descriptions are keyed by a hash of the contents of the file, and by the version of the extractor
+    * If the file can't be parsed, it's parsed again while repairing its encoding, see ess.replacer
+
+    :raises OSError: if the file can't be read
+
+    :param xml_path: Path of 'study_description.xml'
+    :param description_cache: If specified, a DiskCache used to reuse descriptions extracted in previous runs
+    :return: Dictionary representation of 'study_description.xml', see extract_description()
+    """
+    if description_cache is None:
+        return _parse_description(xml_path)
+
+    digest = hashlib.sha1()
+    with open(xml_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    cache_key = ('description', extractor_version, digest.hexdigest())
+
+    description = description_cache.get(cache_key)
+    if description is None:
+        description = _parse_description(xml_path)
+        description_cache.put(cache_key, description)
+    return description
+
+
+def _parse_description(xml_path):
+    try:
+        return extract_description(xml_path)
+    except etree.LxmlError:
+        # known bad characters are repaired while the file is parsed again, without writing to the ESS study
+        print("There was an error decoding %s. Attempting to fix encoding errors..." % xml_path)
+        with open_repaired(xml_path) as source:
+            return extract_description(source)
+
+
 def generate_report(bids_file: BIDSProject) -> str:
     """
     Function used to indicate information/warnings regarding the conversion from ESS
@@ -96,8 +152,7 @@ def generate_report(bids_file: BIDSProject) -> str:
                 warnings_list.append(
                     "Warning: session %s specifies electrodes, but no coordinate system" % session_name)
             for filename, scan in session.scans.items():
-                if list(session.electrodes.keys()) != list(
-                        filter(lambda x: scan.channels[x]['type'] == 'EEG', scan.channels.keys())):
+                if list(session.electrodes.keys()) != list(index_rows(scan.channels, 'type').get('EEG', ())):
                     warnings_list.append(
                         "Warning: session %s has mismatched electrodes with %s" % (session_name, filename))
 
@@ -112,23 +167,61 @@ def generate_report(bids_file: BIDSProject) -> str:
     return report
 
 
-def _generate_bids_sessions(bids_file, xml, input_directory):
+def _generate_bids_sessions(bids_file, xml, input_directory, channel_extractor, channel_cache=None, manifest=None):
     """
     Internal function used to pick apart each session of a given ESS study, and map it to BIDS
 
     :param bids_file: BIDSProject, which fields are changed in place
     :param xml: Dictionary representation of 'study_description.xml'
     :param input_directory: Source filepath for a given ESS study
+    :param channel_extractor: ChannelExtractor used to extract channels, see generate_bids_project()
+    :param channel_cache: If specified, a DiskCache used to reuse channels extracted in previous runs
+    :param manifest: If specified, the SourceManifest of a previous conversion, see generate_bids_project()
     :return:
     """
 
-    subject_num = 0
     subject_dict = dict()
-    RPS_electrodes = dict()
     session_numbers = dict()
 
-    matlab_out = io.StringIO()
-    matlab_err = io.StringIO()
+    # the backend is started as soon as any electrode set turns out not to be cached, so that it loads (e.g. Matlab
+    # and EEGLAB) while the event instance files are read, rather than once its first extraction is waited on
+    electrode_requests = _collect_electrode_requests(xml, input_directory)
+    cached_electrodes = _lookup_electrodes(electrode_requests, channel_extractor, channel_cache)
+    if len(cached_electrodes[0]) < len(electrode_requests):
+        channel_extractor.start()
+
+    # labels assigned by a previous conversion are kept, and new subjects and sessions are given labels that
+    # weren't assigned yet. sessions (of ESS subjects) whose input is unchanged don't need their events
+    fingerprints = fingerprint_sessions(xml, input_directory) if manifest is not None else dict()
+    unchanged = set()
+    reserved_subjects = set()
+    reserved_sessions = dict()
+    if manifest is not None:
+        unchanged = {(session_key, subject_key) for session_key, subjects in fingerprints.items()
+                     for subject_key, fingerprint in subjects.items()
+                     if manifest.is_unchanged(session_key, subject_key, fingerprint)}
+        reserved_subjects = set(manifest.subjects.values())
+        for subject_id, session_id in manifest.sessions.values():
+            reserved_sessions.setdefault(subject_id, set()).add(session_id)
+        bids_file.source_manifest = manifest
+
+    # number of runs of each (subject, session, task)
+    run_counts = dict()
+
+    # channels and electrodes only depend on the recording parameter set, so each table is built once and shared by
+    # every scan (or session) of the parameter set
+    channel_tables = dict()
+    electrode_tables = dict()
+
+    # event instance files are all read concurrently, while electrodes are extracted and the sessions are generated
+    event_resolver = EventCodeResolver(xml['event_codes'], underscore_to_camelcase)
+    recording_events = prefetch_event_instances(_collect_event_requests(xml, input_directory, unchanged),
+                                                event_resolver)
+
+    # electrode sets are extracted up front, so that recordings of different parameter sets can be extracted
+    # concurrently. any set that's only needed later on is extracted on demand
+    RPS_electrodes = _extract_electrodes(electrode_requests, xml['rec_parameter_sets'], channel_extractor,
+                                         channel_cache, cached_electrodes)
 
     for session_key, session_parent in xml['sessions'].items():
         for session in session_parent: # multiple sessions may be indexed on the same number, therefore each number is its own list of sessions
@@ -140,8 +233,10 @@ def _generate_bids_sessions(bids_file, xml, input_directory):
             for subject_key, subject in session['Subjects'].items():
 
                 if subject_key not in subject_dict.keys():
-                    subject_num += 1
-                    subject_id = "%02d" % subject_num
+                    subject_id = manifest.subjects.get(subject_key) if manifest is not None else None
+                    if subject_id is None:
+                        subject_id = _next_label(len(subject_dict) + 1,
+                                                 reserved_subjects.union(subject_dict.values()))
 
                     if DISPLAY_VALS:
                         print("Adding Subject %s to Structure..." % subject_id, flush=True)
@@ -161,7 +256,14 @@ def _generate_bids_sessions(bids_file, xml, input_directory):
                 subject_id = subject_dict[subject_key]
 
                 if session_key not in session_numbers:
-                    session_id = "%02d" % (len(bids_file.subjects[subject_id].sessions) + 1)
+                    session_id = None
+                    if manifest is not None and session_key in manifest.sessions \
+                            and manifest.sessions[session_key][0] == subject_id:
+                        session_id = manifest.sessions[session_key][1]
+                    if session_id is None or session_id in bids_file.subjects[subject_id].sessions:
+                        session_id = _next_label(len(bids_file.subjects[subject_id].sessions) + 1,
+                                                 reserved_sessions.get(subject_id, set()).union(
+                                                     bids_file.subjects[subject_id].sessions))
                     session_numbers[session_key] = session_id
 
                     if DISPLAY_VALS:
@@ -212,12 +314,18 @@ def _generate_bids_sessions(bids_file, xml, input_directory):
                 else:
                     session_id = session_numbers[session_key]
 
+                if manifest is not None:
+                    manifest.sessions[session_key] = [subject_id, session_id]
+                    if (session_key, subject_key) not in unchanged:
+                        manifest.changed_sessions.add((subject_id, session_id))
+
                 rec_parameter_sets = xml['rec_parameter_sets']
 
                 for run_key, run in session['Data Recordings'].items():
                     current_ses_dir = os.path.join(input_directory, "session", session_key)
 
-                    run_count = len([i for i in bids_file.subjects[subject_id].sessions[session_id].scans.keys() if task_name in i]) + 1
+                    run_count = run_counts[(subject_id, session_id, task_name)] = \
+                        run_counts.get((subject_id, session_id, task_name), 0) + 1
                     current_label = "eeg/sub-%s_ses-%s_task-%s_run-%1d_eeg.set" % (subject_id, session_id, task_name, run_count)
 
                     bids_file.subjects[subject_id].sessions[session_id].scans[current_label] = BIDSScan(os.path.join(current_ses_dir, run['Filename']), task_name)
@@ -226,54 +334,19 @@ def _generate_bids_sessions(bids_file, xml, input_directory):
                     bids_file.subjects[subject_id].sessions[session_id].scans[current_label].fields['ESS_inSessionRecordingNum'] = run['Filename'][run['Filename'].rfind('_') + 1:run['Filename'].rfind('.')]
 
                     try:
-                        f = open(os.path.join(current_ses_dir, run['Event Instance File']), "r")
-
-                        for line in f.readlines():
-                            tokens = line.strip('\n').split('\t')
-                            tags = None
-
-                            if tokens[0] in bids_file.event_codes:
-                                tags = tokens[2].replace(bids_file.event_codes[tokens[0]], '')
-                            else:
-                                for tl, task in bids_file.tasks.items():
-                                    if tl == tokens[0]:
-                                        tags = tokens[2].replace(task.event_codes, '')
-                                        break
-
-                            bids_file.subjects[subject_id].sessions[session_id].scans[current_label].events.append(
-                                {'onset': tokens[1], 'duration': 'n/a', 'event_code': tokens[0]})
-
-                            if tags:
-                                bids_file.subjects[subject_id].sessions[session_id].scans[
-                                    current_label].events[-1]['HED'] = tags
-
-                        f.close()
+                        if (session_key, subject_key) not in unchanged:
+                            bids_file.subjects[subject_id].sessions[session_id].scans[current_label].events = \
+                                recording_events[(os.path.join(current_ses_dir, run['Event Instance File']),
+                                                  task_name)].result()
                     except OSError as e:
                         print("Event instance file %s unavailable." % run['Event Instance File'])
                         raise e
 
                     if not bids_file.subjects[subject_id].sessions[session_id].electrodes:
                         if run['Recording Parameter Set Label'] not in RPS_electrodes.keys():
-                            print("Extracting electrode set from %s..." % run['Recording Parameter Set Label'])
-
-                            rps_entry = get_matlab_instance().ExtractChannels(run['Filename'], current_ses_dir, nargout=5,
-                                                                      stdout=matlab_out, stderr=matlab_err)
-                            if DISPLAY_MATLAB_OUTPUT:
-                                print(matlab_out.getvalue())
-                                print(matlab_err.getvalue())
-
-                            new_rps_entry = list()
-                            for i in range(6):
-                                new_rps_entry.append(list())
-
-                            for i in range(len(rps_entry[1])):
-                                if not (rps_entry[1][i] and rps_entry[1][i] != "EEG"):
-                                    for j in range(0, len(rps_entry)):
-                                        new_rps_entry[j].append(rps_entry[j][i])
-                                elif rps_entry[1][i] == 'EKG':
-                                    rps_entry[1][i] = 'ECG'
-
-                            RPS_electrodes[run['Recording Parameter Set Label']] = new_rps_entry
+                            RPS_electrodes.update(_extract_electrodes(
+                                {run['Recording Parameter Set Label']: (run['Filename'], current_ses_dir)},
+                                xml['rec_parameter_sets'], channel_extractor, channel_cache))
 
                         rps_entry = RPS_electrodes[run['Recording Parameter Set Label']]
                         bids_file.subjects[subject_id].sessions[session_id].coordsystem = {
@@ -286,53 +359,232 @@ def _generate_bids_sessions(bids_file, xml, input_directory):
                         bids_file.subjects[subject_id].field_definitions['legacy_recordingParameterSet'] = \
                         session_level_tags['legacy_recordingParameterSet']
 
-                        for i in range(0, len(rps_entry[0])):
-                            bids_file.subjects[subject_id].sessions[session_id].electrodes[rps_entry[0][i]] = {'x': rps_entry[2][i], 'y': rps_entry[3][i], 'z': rps_entry[4][i]}
-
-                    for ps_label, ps in [ (psl, ps) for psl, ps in rec_parameter_sets.items() if psl == run['Recording Parameter Set Label']]:
-                        for modality, mode in ps.items():
-                            modality = modality.upper()
-                            if modality not in channel_types and modality != 'EKG':
-                                modality = 'MISC'
-                            if modality == 'EEG':
-                                bids_file.tasks[task_name].add_field("SamplingFrequency", float(mode['Sampling Rate']),
-                                                                     subject_label=subject_id, session_label=session_id,
-                                                                     scan_name=current_label)
-                                bids_file.tasks[task_name].add_field("CapManufacturer", mode['Name'] or "n/a",
-                                                                     subject_label=subject_id,
-                                                                     session_label=session_id,
-                                                                     scan_name=current_label)
-                                bids_file.tasks[task_name].add_field("EEGPlacementScheme", mode['Channel Location Type'] or "n/a",
-                                                                     subject_label=subject_id, session_label=session_id,
-                                                                     scan_name=current_label)
-                                bids_file.tasks[task_name].add_field("EEGReference", mode['Reference Label'] or "n/a",
-                                                                     subject_label=subject_id, session_label=session_id,
-                                                                     scan_name=current_label)
-                            if modality == 'EKG':
-                                modality = 'ECG'
-
-                            for channel in mode['Channel Labels']:
-                                if channel in mode['Non-Scalp Channel Labels']:
-                                    if channel not in bids_file.field_replacements['channels']:
-                                        bids_file.field_replacements['channels'][channel] = list()
-
-                                    has_entry = any(filter(lambda x: x['where']['legacy_recordingParameterSet'] == run['Recording Parameter Set Label'], bids_file.field_replacements['channels'][channel]))
-
-                                    if not has_entry:
-                                        bids_file.field_replacements['channels'][channel].append(
-                                            {'where': {
-                                                'legacy_recordingParameterSet': run['Recording Parameter Set Label']
-                                            }, 'type': None}
-                                        )
-                                    modality = 'null'
-
-                                channels_dict = bids_file.subjects[subject_id].sessions[session_id].scans[
-                                    current_label].channels
-                                channels_dict[channel] = dict()
-                                channels_dict[channel]['type'] = modality
-                                channels_dict[channel]['units'] = 'uV'
-                                channels_dict[channel]['sampling_frequency'] = mode['Sampling Rate']
-                                # stubbed, since all channels have the same reference, so this only goes in the sidecar...channels_dict[channel]['reference'] = mode['Reference Label']
+                        if run['Recording Parameter Set Label'] not in electrode_tables:
+                            electrode_tables[run['Recording Parameter Set Label']] = SharedTable(
+                                {rps_entry[0][i]: {'x': rps_entry[2][i], 'y': rps_entry[3][i], 'z': rps_entry[4][i]}
+                                 for i in range(0, len(rps_entry[0]))})
+                        bids_file.subjects[subject_id].sessions[session_id].electrodes = \
+                            electrode_tables[run['Recording Parameter Set Label']]
+
+                    ps = rec_parameter_sets.get(run['Recording Parameter Set Label']) or dict()
+                    for modality, mode in ps.items():
+                        if modality.upper() == 'EEG':
+                            bids_file.tasks[task_name].add_field("SamplingFrequency", float(mode['Sampling Rate']),
+                                                                 subject_label=subject_id, session_label=session_id,
+                                                                 scan_name=current_label)
+                            bids_file.tasks[task_name].add_field("CapManufacturer", mode['Name'] or "n/a",
+                                                                 subject_label=subject_id,
+                                                                 session_label=session_id,
+                                                                 scan_name=current_label)
+                            bids_file.tasks[task_name].add_field("EEGPlacementScheme", mode['Channel Location Type'] or "n/a",
+                                                                 subject_label=subject_id, session_label=session_id,
+                                                                 scan_name=current_label)
+                            bids_file.tasks[task_name].add_field("EEGReference", mode['Reference Label'] or "n/a",
+                                                                 subject_label=subject_id, session_label=session_id,
+                                                                 scan_name=current_label)
+
+                    if run['Recording Parameter Set Label'] not in channel_tables:
+                        channel_tables[run['Recording Parameter Set Label']] = \
+                            _generate_channel_table(bids_file, run['Recording Parameter Set Label'], ps)
+                    bids_file.subjects[subject_id].sessions[session_id].scans[current_label].channels = \
+                        channel_tables[run['Recording Parameter Set Label']]
+
+    if manifest is not None:
+        manifest.subjects.update(subject_dict)
+        manifest.fingerprints = fingerprints
+
+
+def _next_label(number, taken):
+    """
+    Internal function used to find the first label, from a given number onwards, that isn't taken yet
+
+    :param number: Number of the first candidate label
+    :param taken: Collection of labels that can't be used
+    :return: Label made of the number, padded to two digits
+    """
+    while "%02d" % number in taken:
+        number += 1
+    return "%02d" % number
+
+
+def _generate_channel_table(bids_file, rps_label, ps):
+    """
+    Internal function used to build the entries of '_channels.tsv' shared by every scan of a recording parameter set
+
+    * Non-scalp channels are given an entry in field_replacements, so that their type can be filled in
+
+    :param bids_file: BIDSProject, which field_replacements are changed in place
+    :param rps_label: Label of the recording parameter set
+    :param ps: Recording parameter set from 'study_description.xml', mapping each modality to its description
+    :return: SharedTable of channel labels, each mapped to their type, units, and sampling frequency
+    """
+    channels_dict = dict()
+    replaced = set()
+
+    for modality, mode in ps.items():
+        modality = modality.upper()
+        if modality not in channel_types and modality != 'EKG':
+            modality = 'MISC'
+        if modality == 'EKG':
+            modality = 'ECG'
+
+        non_scalp_channels = set(mode['Non-Scalp Channel Labels'])
+        for channel in mode['Channel Labels']:
+            if channel in non_scalp_channels:
+                if channel not in bids_file.field_replacements['channels']:
+                    bids_file.field_replacements['channels'][channel] = list()
+
+                if channel not in replaced:
+                    replaced.add(channel)
+                    bids_file.field_replacements['channels'][channel].append(
+                        {'where': {
+                            'legacy_recordingParameterSet': rps_label
+                        }, 'type': None}
+                    )
+                modality = 'null'
+
+            channels_dict[channel] = dict()
+            channels_dict[channel]['type'] = modality
+            channels_dict[channel]['units'] = 'uV'
+            channels_dict[channel]['sampling_frequency'] = mode['Sampling Rate']
+            # stubbed, since all channels have the same reference, so this only goes in the sidecar...channels_dict[channel]['reference'] = mode['Reference Label']
+
+    return SharedTable(channels_dict)
+
+
+def _collect_event_requests(xml, input_directory, unchanged=()):
+    """
+    Internal function used to list the event instance file of every recording, in the order they're generated
+
+    :param xml: Dictionary representation of 'study_description.xml'
+    :param input_directory: Source filepath for a given ESS study
+    :param unchanged: Collection of (ESS session number, ESS subject lab ID) pairs whose events aren't needed
+    :return: List of (path, task label) pairs
+    """
+    requests = list()
+
+    for session_key, session_parent in xml['sessions'].items():
+        for session in session_parent:
+            if all((session_key, subject_key) in unchanged for subject_key in session['Subjects']):
+                continue
+            task_name = underscore_to_camelcase(str(session['Task Label']))
+            for run in session['Data Recordings'].values():
+                requests.append((os.path.join(input_directory, "session", session_key, run['Event Instance File']),
+                                 task_name))
+
+    return requests
+
+
+def _collect_electrode_requests(xml, input_directory):
+    """
+    Internal function used to find the recording that each electrode set is extracted from
+
+    * Electrodes are taken from the first recording of every subject's session, mirroring _generate_bids_sessions()
+
+    :param xml: Dictionary representation of 'study_description.xml'
+    :param input_directory: Source filepath for a given ESS study
+    :return: Dictionary of recording parameter set labels, each mapped to a (filename, directory) pair
+    """
+    requests = dict()
+    visited = set()
+
+    for session_key, session_parent in xml['sessions'].items():
+        for session in session_parent:
+            for subject_key in session['Subjects']:
+                if (subject_key, session_key) in visited:
+                    continue
+                for run in session['Data Recordings'].values():
+                    visited.add((subject_key, session_key))
+                    if run['Recording Parameter Set Label'] not in requests:
+                        requests[run['Recording Parameter Set Label']] = \
+                            (run['Filename'], os.path.join(input_directory, "session", session_key))
+                    break
+
+    return requests
+
+
+def _lookup_electrodes(requests, channel_extractor, channel_cache):
+    """
+    Internal function used to fetch the electrode sets of several recording parameter sets from the channel cache
+
+    * Cached entries are keyed by the backend, the recording's path, size and modification time, as well as its
+      recording parameter set label, so any change to the recording invalidates them
+
+    :param requests: Dictionary of recording parameter set labels, each mapped to a (filename, directory) pair
+    :param channel_extractor: ChannelExtractor used to extract channels, see generate_bids_project()
+    :param channel_cache: If specified, a DiskCache used to reuse channels extracted in previous runs
+    :return: Tuple of a dictionary of the recording parameter set labels that are cached, each mapped to lists of
+             labels, types, X, Y, and Z, and a dictionary of recording parameter set labels, each mapped to its
+             cache key
+    """
+    rps_entries = dict()
+    cache_keys = dict()
+
+    for rps_label, (filename, directory) in requests.items():
+        if channel_cache is not None and channel_extractor.cacheable:
+            try:
+                full_path = os.path.abspath(os.path.join(directory, filename))
+                stat = os.stat(full_path)
+            except OSError:
+                continue
+            cache_keys[rps_label] = ('channels', channel_extractor.name, full_path, stat.st_size, stat.st_mtime_ns,
+                                     rps_label)
+            rps_entry = channel_cache.get(cache_keys[rps_label])
+            if rps_entry is not None:
+                rps_entries[rps_label] = rps_entry
+
+    return rps_entries, cache_keys
+
+
+def _extract_electrodes(requests, rec_parameter_sets, channel_extractor, channel_cache, cached=None):
+    """
+    Internal function used to extract the electrode sets of several recording parameter sets
+
+    * Recordings that aren't cached are all handed to the backend at once
+
+    :param requests: Dictionary of recording parameter set labels, each mapped to a (filename, directory) pair
+    :param rec_parameter_sets: Recording parameter sets from 'study_description.xml', each mapped by label
+    :param channel_extractor: ChannelExtractor used to extract channels, see generate_bids_project()
+    :param channel_cache: If specified, a DiskCache used to reuse channels extracted in previous runs
+    :param cached: If specified, what _lookup_electrodes() returned for the same requests. Otherwise, the requests
+                   are looked up in channel_cache
+    :return: Dictionary of recording parameter set labels, each mapped to lists of EEG labels, types, X, Y, and Z
+    """
+    rps_entries, cache_keys = cached or _lookup_electrodes(requests, channel_extractor, channel_cache)
+    rps_entries = dict(rps_entries)
+
+    pending = {rps_label: request for rps_label, request in requests.items() if rps_label not in rps_entries}
+
+    for rps_label in requests:
+        if rps_label in rps_entries:
+            print("Using cached electrode set of %s..." % rps_label)
+        else:
+            print("Extracting electrode set from %s..." % rps_label)
+
+    if pending:
+        rps_entries.update(channel_extractor.extract(pending, rec_parameter_sets))
+        for rps_label in pending:
+            if rps_label in cache_keys:
+                channel_cache.put(cache_keys[rps_label], rps_entries[rps_label])
+
+    electrodes = dict()
+    for rps_label in requests:
+        rps_entry = rps_entries[rps_label]
+
+        new_rps_entry = list()
+        for i in range(6):
+            new_rps_entry.append(list())
+
+        for i in range(len(rps_entry[1])):
+            if not (rps_entry[1][i] and rps_entry[1][i] != "EEG"):
+                for j in range(0, len(rps_entry)):
+                    new_rps_entry[j].append(rps_entry[j][i])
+            elif rps_entry[1][i] == 'EKG':
+                rps_entry[1][i] = 'ECG'
+
+        electrodes[rps_label] = new_rps_entry
+
+    return electrodes
 
 
 def _generate_bids_tasks(bids_file, xml):
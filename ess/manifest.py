@@ -0,0 +1,113 @@
+"""
+This module defines SourceManifest, a record of the ESS input that each session of a BIDS study was converted from.
+"""
+
+import hashlib
+import json
+import os.path
+
+from filesystem import util
+
+__all__ = ['SourceManifest', 'manifest_filename', 'manifest_version', 'fingerprint_sessions']
+
+manifest_filename = 'ess2bids_manifest.json'
+
+# bumped whenever the generator changes its output for the same input, which invalidates every fingerprint
+manifest_version = 1
+
+
+class SourceManifest:
+    """
+    Record of a previous conversion, stored at the root of the BIDS study, used to only export what changed since
+
+    * Subject and session labels are kept across conversions, so a session added to the ESS study doesn't change the
+      labels of the existing subjects and sessions, even if it comes first in 'study_description.xml'
+    * Each session of each ESS subject has a fingerprint of its input, see fingerprint_sessions(). Fingerprints are
+      discarded if the conversion options or manifest_version changed
+    * The manifest should only be saved once the BIDS study was exported
+
+    Attributes:
+        path: location of the manifest file
+        options: conversion options that the fingerprints are valid for
+        subjects: dictionary of ESS subject lab IDs, each mapped to their BIDS subject label
+        sessions: dictionary of ESS session numbers, each mapped to the BIDS labels of their [subject, session]
+        fingerprints: dictionary of ESS session numbers, each mapped to a dictionary of ESS subject lab IDs and the
+                      fingerprint of their input
+        changed_sessions: set of (subject label, session label) pairs whose input changed, filled in by the generator.
+                          Isn't saved
+    """
+
+    def __init__(self, path, options=None):
+        self.path = path
+        self.options = options
+        self.changed_sessions = set()
+        try:
+            with open(path, 'r') as f:
+                manifest = json.load(f)
+            self.subjects = dict(manifest.get('subjects') or dict())
+            self.sessions = dict(manifest.get('sessions') or dict())
+            self.fingerprints = dict(manifest.get('fingerprints') or dict())
+            if manifest.get('version') != manifest_version or manifest.get('options') != options:
+                self.fingerprints = dict()
+        except (OSError, ValueError, AttributeError, TypeError):
+            self.subjects = dict()
+            self.sessions = dict()
+            self.fingerprints = dict()
+
+    def is_unchanged(self, session_key, subject_key, fingerprint):
+        """
+        :param session_key: ESS session number
+        :param subject_key: ESS subject lab ID
+        :param fingerprint: Current fingerprint of the session's input, see fingerprint_sessions()
+        :return: True if the session of the subject was converted from the same input
+        """
+        return (self.fingerprints.get(session_key) or dict()).get(subject_key) == fingerprint
+
+    def save(self):
+        """
+        Atomically writes the manifest to its path
+
+        :raises OSError
+
+        :return:
+        """
+        util.write_json_atomic({'version': manifest_version, 'options': self.options, 'subjects': self.subjects,
+                                'sessions': self.sessions, 'fingerprints': self.fingerprints}, self.path)
+
+
+def fingerprint_sessions(xml, input_directory):
+    """
+    Computes a fingerprint of the input of every session of every subject, without reading the (large) recordings
+
+    * A fingerprint covers the session's fragment of 'study_description.xml', the recording parameter sets and event
+      codes it uses, as well as the size and modification time of its recordings and event instance files
+
+    :param xml: Dictionary representation of 'study_description.xml'
+    :param input_directory: Source filepath for a given ESS study
+    :return: Dictionary of ESS session numbers, each mapped to a dictionary of ESS subject lab IDs and their
+             fingerprint
+    """
+    event_codes = json.dumps(xml['event_codes'], sort_keys=True, default=str).encode('utf-8')
+    digests = dict()
+
+    for session_key, session_parent in xml['sessions'].items():
+        for session in session_parent:
+            fragment = [json.dumps(session, sort_keys=True, default=str).encode('utf-8')]
+            for run in session['Data Recordings'].values():
+                fragment.append(json.dumps(xml['rec_parameter_sets'].get(run['Recording Parameter Set Label']),
+                                           sort_keys=True, default=str).encode('utf-8'))
+                for filename in (run['Filename'], run['Event Instance File']):
+                    try:
+                        stat = os.stat(os.path.join(input_directory, "session", session_key, filename))
+                        fragment.append(b'%d\0%d' % (stat.st_size, stat.st_mtime_ns))
+                    except (OSError, TypeError):
+                        fragment.append(b'missing')
+
+            for subject_key in session['Subjects']:
+                if subject_key not in digests.setdefault(session_key, dict()):
+                    digests[session_key][subject_key] = hashlib.sha1(event_codes)
+                for chunk in fragment:
+                    digests[session_key][subject_key].update(b'\n' + chunk)
+
+    return {session_key: {subject_key: digest.hexdigest() for subject_key, digest in subjects.items()}
+            for session_key, subjects in digests.items()}
@@ -1,24 +1,93 @@
-import os
-import shutil
-
 """
 This module is designed to fix some encoding issues regarding 'study_description.xml' and use of the XML tagging library.
+
+Instead of writing a fixed copy of the file, the file is repaired on the fly while it's fed to lxml, so the ESS study
+may be read-only.
 """
 
-def replacer_make(study_dir):
-    with open(os.path.join(study_dir, 'study_description.xml'), 'r', encoding='utf8') as desc:
-        new_lines = list()
-        for line in desc:
-            line = line.replace('×', 'x').replace('—', '-').replace('"', '"')  # .replace('Ω', u"\u03A9")
-            new_lines.append(line)
+import codecs
+
+__all__ = ['RepairedXMLStream', 'open_repaired', 'replacements']
+
+# characters that the XML tagging library fails on, each mapped to its replacement
+replacements = {'×': 'x', '—': '-'}
+
+
+def _decode_as_cp1252(error):
+    # bytes that aren't valid UTF-8 were most likely written by a Windows editor
+    return error.object[error.start:error.end].decode('cp1252', errors='replace'), error.end
+
+
+codecs.register_error('ess2bids-cp1252', _decode_as_cp1252)
+
+
+class RepairedXMLStream:
+    """
+    Binary file-like object that repairs the encoding of an XML file as it's read
+
+    * The file is decoded as UTF-8. Any byte that isn't valid UTF-8 is decoded as Windows-1252 instead
+    * Characters listed in replacements are replaced, and the result is encoded back to UTF-8
+    * Only one chunk of the file is held in memory at a time
+
+    Attributes:
+        source: underlying binary file object
+    """
+
+    def __init__(self, source, chunk_size=1024 * 1024):
+        self.source = source
+        self.chunk_size = chunk_size
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='ess2bids-cp1252')
+        self._translation = str.maketrans(replacements)
+        self._buffer = b''
+        self._offset = 0
+        self._eof = False
+
+    def _fill(self):
+        # reads chunks until some repaired data is available, since a chunk may end within a UTF-8 sequence
+        while self._offset >= len(self._buffer) and not self._eof:
+            chunk = self.source.read(self.chunk_size)
+            self._eof = not chunk
+            self._buffer = self._decoder.decode(chunk, final=self._eof).translate(self._translation).encode('utf-8')
+            self._offset = 0
+
+    def read(self, size=-1):
+        """
+        Reads repaired data, which may be shorter than size. An empty result means that the whole file was read
+
+        :param size: Maximum number of bytes to read, or -1 to read the rest of the file
+        :return: bytes
+        """
+        if size is None or size < 0:
+            data = list()
+            self._fill()
+            while self._offset < len(self._buffer):
+                data.append(self._buffer[self._offset:])
+                self._offset = len(self._buffer)
+                self._fill()
+            return b''.join(data)
+
+        self._fill()
+        data = self._buffer[self._offset:self._offset + size]
+        self._offset += len(data)
+        return data
+
+    def close(self):
+        self.source.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
 
-        if not os.path.exists(os.path.join(study_dir, 'DELETEME')):
-            os.makedirs(os.path.join(study_dir, 'DELETEME'))
 
-    with open(os.path.join(study_dir, 'DELETEME', 'study_description.xml'), 'w') as temp:
-        for line in new_lines:
-            temp.write(line)
+def open_repaired(path):
+    """
+    Opens an XML file, repairing its encoding as it's read
 
+    :raises OSError: if the file can't be opened
 
-def replacer_delete(study_dir):
-    shutil.rmtree(os.path.join(study_dir, 'DELETEME'), ignore_errors=True)
+    :param path: Path of the XML file
+    :return: RepairedXMLStream, which should be closed once read
+    """
+    return RepairedXMLStream(open(path, 'rb'))
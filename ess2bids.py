@@ -1,11 +1,29 @@
 """
 Main script for converting an ESS study to a BIDS study
 
-Usage: python ess2bids.py [-sv] <input> <output>
+Usage: python ess2bids.py [-svlbrpf] [-j N] [-e {matlab,native,fake}] [--engines N] [--no-channel-cache]
+                          [--no-description-cache] <input> <output>
 
 Options:
     -s, --stub: Skip the process of copying over large scan files, as well as files ignored by BIDS
     -v, --verbose: Provide additional logging into standard output
+    -l, --legacy: Use the deprecated ESS converter
+    -b, --batch: Convert every study within <input>, each into a subdirectory of <output>. A study that fails to
+                 convert doesn't stop the batch, and a summary of every conversion is printed at the end
+    -r, --resume: In batch mode, skip every study that was exported by a previous batch, according to the journal
+                  kept in <output>, unless its input or the conversion options changed
+    -j, --jobs: Number of studies converted concurrently in batch mode, each in its own process with its own
+                channel extractor (and Matlab engines)
+    -p, --pipeline: In batch mode, export each study in the background while the next study is generated. Has no
+                    effect along with --jobs, since studies already overlap across processes
+    -f, --full: Export every session, even if its input didn't change since the study was last converted. Subject and
+                session labels assigned by the previous conversion are still kept
+    -e, --extractor: Backend used to extract channel locations from '.set' files. 'matlab' (the default) loads each
+                     recording through EEGLAB, while 'native' reads the channel locations without MATLAB.
+                     'fake' synthesizes channel locations from 'study_description.xml', for tests and benchmarks
+    --engines: Number of Matlab engines used to extract channel locations concurrently
+    --no-channel-cache: Don't reuse (or store) channel locations extracted in previous runs
+    --no-description-cache: Don't reuse (or store) 'study_description.xml' files parsed in previous runs
 
 Positional Arguments:
     input: Source of the root of a given ESS study
@@ -16,21 +34,40 @@ import argparse
 
 from filesystem.export import export_project
 from filesystem import util
+from filesystem.journal import BatchJournal, journal_filename
+from ess.manifest import SourceManifest, manifest_filename
+from filesystem.snapshot import snapshot_filename
 from ess.generator import *
 from ess.deprecated.generator import generate_bids_project as old_generate_bids_project
-from ess.replacer import replacer_delete, replacer_make
-from utilities.matlab_instance import *
-import matlab.engine
+from utilities.matlab_instance import MatlabStartupError
+from utilities.extractors import create_extractor, extractor_names
+from utilities.disk_cache import DiskCache, default_cache_path
 import copy
 import sys
 import os
 import json
+import time
+import traceback
+import queue
+import threading
+import multiprocessing.util
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+# number of generated studies that may wait to be exported in pipelined batch mode
+pipeline_depth = 1
+
+# seconds between checks that the export thread is still alive, while waiting for it in pipelined batch mode
+exporter_poll_interval = 1.0
 
 default_bids_validator_config = {
     "ignore": (),
     "warn": (),
     "error": (),
-    "ignoredFiles": ["/field_replacements.json", "/archived/**", "/VALIDATOR_OUTPUT.txt", "/REPORT.txt"]
+    "ignoredFiles": ["/field_replacements.json", "/archived/**", "/VALIDATOR_OUTPUT.txt", "/REPORT.txt",
+                     "/" + manifest_filename, "/" + snapshot_filename]
 }
 
 
@@ -39,7 +76,7 @@ def load_config():
         config_json = open('config.json')
         config = json.load(config_json)
         config_json.close()
-        required = ['eeglab_path', 'BIDSVersion']
+        required = ['BIDSVersion']
         if not all(config.get(k) for k in required):
             print("Missing fields in 'config.json':")
             print([k for k in required if not config.get(k)])
@@ -65,6 +102,275 @@ def write_validator_config(bvc, ignored_files, output_path, config_name=".bids-v
     util.write_json(output_config, os.path.join(output_path, config_name))
 
 
+def _check_extractor_config(config, name):
+    if name == 'matlab' and not config.get('eeglab_path'):
+        print("Missing fields in 'config.json':")
+        print(['eeglab_path'])
+        sys.exit(1)
+
+
+def _create_extractor(config, name, pool_size=1, verbose=False):
+    _check_extractor_config(config, name)
+
+    # Matlab engines only start loading once a study needs channels that aren't cached, in the background while its
+    # event instance files are read, see ChannelExtractor.start()
+    return create_extractor(name, config, pool_size=pool_size, verbose=verbose)
+
+
+def _conversion_options(config, args):
+    # options that change the output of a study, for which a previous conversion can't be reused
+    return {'legacy': args.legacy, 'stub': args.stub, 'extractor': args.extractor,
+            'BIDSVersion': config['BIDSVersion']}
+
+
+def _generate_study(study, config, args, channel_extractor, caches):
+    if args.legacy:
+        return old_generate_bids_project(os.path.abspath(study), args.verbose, channel_extractor)
+
+    # the manifest of a previous conversion tells which sessions changed, and keeps their labels stable
+    manifest = SourceManifest(os.path.join(_study_output(study, args), manifest_filename),
+                              _conversion_options(config, args))
+    if args.full:
+        manifest.fingerprints.clear()
+    return generate_bids_project(os.path.abspath(study), args.verbose, channel_extractor, caches['channels'],
+                                 caches['descriptions'], manifest)
+
+
+def _export_study(bids_file, output, config, args):
+    bids_file.dataset_description['BIDSVersion'] = config['BIDSVersion']
+    report = generate_report(bids_file)
+    manifest = bids_file.source_manifest
+    export_project(bids_file, output, stub=args.stub, verbose=args.verbose, additional_report=report,
+                   sessions=manifest.changed_sessions if manifest is not None else None)
+    write_validator_config(config['bids-validator-config'], bids_file.ignored_files, output)
+    if manifest is not None:
+        manifest.save()
+
+
+def _describe_error(e):
+    if isinstance(e, LXMLDecodeError):
+        return "Unable to decode 'study_description.xml'"
+    if isinstance(e, (MatlabStartupError, OSError)):
+        return str(e)
+    return f'{type(e).__name__}: {e}'
+
+
+def _study_output(study, args):
+    if args.batch:
+        return os.path.join(args.output, os.path.basename(study))
+    return args.output
+
+
+def _generate_timed(study, config, args, channel_extractor, caches, close_extractor=False):
+    timings = dict()
+    start = time.perf_counter()
+    try:
+        return _generate_study(study, config, args, channel_extractor, caches), None, timings
+    except Exception as e:
+        if not isinstance(e, (LXMLDecodeError, MatlabStartupError, OSError)):
+            traceback.print_exc()
+        return None, _describe_error(e), timings
+    finally:
+        if close_extractor:
+            channel_extractor.close()
+        timings['generation'] = time.perf_counter() - start
+
+
+def _export_timed(study, bids_file, config, args, timings):
+    start = time.perf_counter()
+    try:
+        _export_study(bids_file, _study_output(study, args), config, args)
+    except Exception as e:
+        if not isinstance(e, OSError):
+            traceback.print_exc()
+        return study, _describe_error(e), timings
+    finally:
+        timings['export'] = time.perf_counter() - start
+    return study, None, timings
+
+
+def _convert_study(study, config, args, channel_extractor, caches, close_extractor=False):
+    """
+    Converts a single study, catching any error so a batch can carry on with the next study
+
+    :param study: Root of the ESS study
+    :param config: Contents of 'config.json'
+    :param args: Parsed command line arguments
+    :param channel_extractor: ChannelExtractor used for the study
+    :param caches: Dictionary of the DiskCaches of 'channels' and 'descriptions', each of which may be None
+    :param close_extractor: If set to True, the extractor is closed as soon as it isn't needed anymore
+    :return: Tuple of the study, an error message (None if the conversion succeeded), and a dictionary of the time
+             spent in 'generation' and 'export', in seconds
+    """
+    bids_file, error, timings = _generate_timed(study, config, args, channel_extractor, caches, close_extractor)
+    if error is not None:
+        return study, error, timings
+    return _export_timed(study, bids_file, config, args, timings)
+
+
+def _export_generated(generated, results, config, args, journal, failure):
+    try:
+        while True:
+            item = generated.get()
+            if item is None:
+                return
+            study, bids_file, error, timings = item
+            if error is None:
+                results.append(_export_timed(study, bids_file, config, args, timings))
+            else:
+                results.append((study, error, timings))
+            _record_result(journal, results[-1])
+    except BaseException as e:
+        # e.g. the journal couldn't be saved. the main thread stops generating, and raises the error
+        failure.append(e)
+
+
+def _convert_pipelined(studies, config, args, channel_extractor, caches, journal):
+    """
+    Converts studies one after the other, exporting each study in a background thread while the next one is generated
+
+    * Generation is bound by the CPU and Matlab, while export is mostly bound by copying scans, so both overlap well
+    * At most pipeline_depth generated studies wait to be exported, which caps the memory held by the pipeline
+    * An error escaping the export thread, rather than failing a single study, stops the batch and is raised again
+
+    :param studies: List of the roots of ESS studies
+    :param config: Contents of 'config.json'
+    :param args: Parsed command line arguments
+    :param channel_extractor: ChannelExtractor used for every study
+    :param caches: Dictionary of the DiskCaches of 'channels' and 'descriptions', each of which may be None
+    :param journal: BatchJournal recording the state of every study
+    :return: List of results, as returned by _convert_study(), in the order of studies
+    """
+    generated = queue.Queue(maxsize=pipeline_depth)
+    results = list()
+    failure = list()
+    exporter = threading.Thread(target=_export_generated,
+                                args=(generated, results, config, args, journal, failure), daemon=True)
+    exporter.start()
+
+    for study in studies:
+        journal.mark(os.path.basename(study), 'generating')
+        item = (study, *_generate_timed(study, config, args, channel_extractor, caches,
+                                        close_extractor=study == studies[-1]))
+        if not _put_generated(generated, item, exporter):
+            channel_extractor.close()
+            break
+    else:
+        _put_generated(generated, None, exporter)
+    exporter.join()
+
+    if failure:
+        raise failure[0]
+    return results
+
+
+def _put_generated(generated, item, exporter):
+    # a plain put() would block forever if the export thread died while the queue is full
+    while exporter.is_alive():
+        try:
+            generated.put(item, timeout=exporter_poll_interval)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _convert_parallel(studies, config, args, journal):
+    """
+    Converts several studies concurrently, each in a worker process
+
+    * Only as many studies as there are workers are submitted at once, so a study is only marked 'generating' once a
+      worker picks it up, rather than while it waits for one
+    * A worker that dies (e.g. killed for running out of memory) fails its study, rather than the batch. Since it
+      breaks the pool, the studies that weren't converted yet fail as well
+
+    :param studies: List of the roots of ESS studies
+    :param config: Contents of 'config.json'
+    :param args: Parsed command line arguments
+    :param journal: BatchJournal recording the state of every study
+    :return: List of results, as returned by _convert_study(), in the order of studies
+    """
+    order = {study: i for i, study in enumerate(studies)}
+    workers = min(args.jobs, len(studies))
+    queued = deque(studies)
+    running = dict()
+    results = list()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_start_worker, initargs=(config, args)) as executor:
+        while queued or running:
+            while queued and len(running) < workers:
+                study = queued.popleft()
+                journal.mark(os.path.basename(study), 'generating')
+                try:
+                    running[executor.submit(_convert_study_in_worker, study)] = study
+                except BrokenProcessPool as e:
+                    results.append((study, _describe_error(e), dict()))
+                    _record_result(journal, results[-1])
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                study = running.pop(future)
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    results.append((study, _describe_error(e), dict()))
+                _record_result(journal, results[-1])
+
+    results.sort(key=lambda result: order[result[0]])
+    return results
+
+
+def _record_result(journal, result):
+    study, error, timings = result
+    timings = {step: round(elapsed, 3) for step, elapsed in timings.items()}
+    if error is None:
+        journal.mark(os.path.basename(study), 'exported', timings=timings)
+    else:
+        journal.mark(os.path.basename(study), 'failed', error=error, timings=timings)
+        print(f'Failed to convert {study}: {error}')
+
+
+__worker = dict()
+
+
+def _start_worker(config, args):
+    # each worker process owns its extractor (and its Matlab engines), which are released when the worker exits
+    __worker['config'] = config
+    __worker['args'] = args
+    __worker['channel_extractor'] = create_extractor(args.extractor, config, pool_size=args.engines,
+                                                     verbose=args.verbose)
+    __worker['caches'] = _create_caches(config, args)
+    multiprocessing.util.Finalize(None, __worker['channel_extractor'].close, exitpriority=0)
+
+
+def _convert_study_in_worker(study):
+    return _convert_study(study, __worker['config'], __worker['args'], __worker['channel_extractor'],
+                          __worker['caches'])
+
+
+def _create_caches(config, args):
+    cache_path = config.get('cache_path') or default_cache_path
+    caches = {'channels': None, 'descriptions': None}
+    if not args.no_channel_cache:
+        caches['channels'] = DiskCache(os.path.join(cache_path, 'channels'),
+                                       int(config.get('channel_cache_size') or 64) * 1024 * 1024)
+    if not args.no_description_cache:
+        caches['descriptions'] = DiskCache(os.path.join(cache_path, 'descriptions'),
+                                           int(config.get('description_cache_size') or 256) * 1024 * 1024)
+    return caches
+
+
+def _print_summary(results, skipped, elapsed):
+    failures = [(study, error) for study, error, _ in results if error is not None]
+    print(f'Converted {len(results) - len(failures)} of {len(results)} studies in {elapsed:.1f}s' +
+          (f', skipped {len(skipped)} studies already converted' if skipped else ''))
+    for study, error, timings in results:
+        print(f"    {'FAILED' if error is not None else 'OK':<6} {sum(timings.values()):8.1f}s  {study}")
+    for study, error in failures:
+        print(f'Failed to convert {study}: {error}')
+
+
 def main():
     config = load_config()
 
@@ -81,60 +387,83 @@ def main():
     parser.add_argument('-b', '--batch', action='store_true',
                         help="if set, converts all studies within directory set by 'input', \
                         and outputs them as subdirectories in 'output'")
+    parser.add_argument('-r', '--resume', action='store_true',
+                        help="if set in batch mode, skips studies that were already converted from the same input")
+    parser.add_argument('-j', '--jobs', type=int, default=config.get('batch_jobs') or 1,
+                        help="number of studies converted concurrently in batch mode, each in its own process")
+    parser.add_argument('-p', '--pipeline', action='store_true',
+                        help="if set in batch mode, exports each study while the next one is generated")
+    parser.add_argument('-f', '--full', action='store_true',
+                        help="if set, exports every session, even those whose input didn't change since the last \
+                        conversion")
+    parser.add_argument('-e', '--extractor', choices=extractor_names,
+                        default=config.get('channel_extractor') or 'matlab',
+                        help="backend used to extract channel locations from '.set' files")
+    parser.add_argument('--engines', type=int, default=config.get('matlab_engines') or 1,
+                        help="number of Matlab engines used to extract channel locations concurrently")
+    parser.add_argument('--no-channel-cache', action='store_true',
+                        help="if set, doesn't reuse channel locations extracted in previous runs")
+    parser.add_argument('--no-description-cache', action='store_true',
+                        help="if set, doesn't reuse study descriptions parsed in previous runs")
 
     args = parser.parse_args()
+    if args.resume and not args.batch:
+        parser.error("--resume can only be used along with --batch")
 
-    if args.batch:
-        studies = [os.path.join(args.input, study) for study in os.listdir(args.input)]
-    else:
-        studies = (args.input,)
+    if not args.batch:
+        channel_extractor = _create_extractor(config, args.extractor, args.engines, args.verbose)
+        study, error, _ = _convert_study(args.input, config, args, channel_extractor,
+                                         _create_caches(config, args), close_extractor=True)
+        if error is not None:
+            print(error)
+            sys.exit(1)
+        return
+
+    studies = [os.path.join(args.input, study) for study in os.listdir(args.input)]
+    start = time.perf_counter()
 
+    # every study's state is checkpointed, so a batch that died can be resumed where it stopped
+    journal = BatchJournal(os.path.join(args.output, journal_filename))
+    options = _conversion_options(config, args)
+    pending, skipped = list(), list()
+    for study in studies:
+        fingerprint = BatchJournal.fingerprint(study, options)
+        if args.resume and journal.is_complete(os.path.basename(study), fingerprint, _study_output(study, args)):
+            skipped.append(study)
+            continue
+        journal.mark(os.path.basename(study), 'pending', save=False, input=os.path.abspath(study),
+                     fingerprint=fingerprint)
+        pending.append(study)
     try:
-        create_matlab_instance(config['eeglab_path'])
-    except matlab.engine.MatlabExecutionError:
-        print("Failed to call 'eeglab()'. Check 'config.json' to make sure your EEGLAB installation path is correct.")
-        sys.exit(1)
-    except matlab.engine.EngineError:
-        print("Unable to start Matlab engine. Did you install 'matlabengineforpython'?")
+        journal.save()
+    except OSError as e:
+        print(e)
         sys.exit(1)
 
-    for study in studies:
-        try:
-            try:
-                if args.legacy:
-                    bids_file = old_generate_bids_project(os.path.abspath(study), args.verbose)
-                else:
-                    bids_file = generate_bids_project(os.path.abspath(study), args.verbose)
-            except LXMLDecodeError:
-                print(f'There was an error with {study}. Attempting to fix encoding errors...')
-                replacer_make(study)
-                if args.legacy:
-                    bids_file = old_generate_bids_project(os.path.abspath(study), args.verbose)
-                else:
-                    bids_file = generate_bids_project(os.path.abspath(study), args.verbose)
-            finally:
-                replacer_delete(study)
-        except LXMLDecodeError:
-            print("Unable to decode 'study_description.xml', exiting...")
-            sys.exit(1)
-        except OSError as e:
-            print(e)
-            sys.exit(1)
+    if skipped:
+        print(f'Skipping {len(skipped)} studies already converted, see {journal.path}')
 
-        bids_file.dataset_description['BIDSVersion'] = config['BIDSVersion']
-        if study == studies[-1]:
-            teardown_matlab_instance()
-        try:
-            report = generate_report(bids_file)
-            if args.batch:
-                output = os.path.join(args.output, os.path.basename(study))
-            else:
-                output = args.output
-            export_project(bids_file, output, stub=args.stub, verbose=args.verbose, additional_report=report)
-            write_validator_config(config['bids-validator-config'], bids_file.ignored_files, output)
-        except OSError as e:
-            print(e)
-            sys.exit(1)
+    results = list()
+    if args.jobs > 1 and len(pending) > 1:
+        # checked once here, rather than in every worker
+        _check_extractor_config(config, args.extractor)
+        results = _convert_parallel(pending, config, args, journal)
+    elif pending and args.pipeline:
+        results = _convert_pipelined(pending, config, args,
+                                     _create_extractor(config, args.extractor, args.engines, args.verbose),
+                                     _create_caches(config, args), journal)
+    elif pending:
+        channel_extractor = _create_extractor(config, args.extractor, args.engines, args.verbose)
+        caches = _create_caches(config, args)
+        for study in pending:
+            journal.mark(os.path.basename(study), 'generating')
+            results.append(_convert_study(study, config, args, channel_extractor, caches,
+                                          close_extractor=study == pending[-1]))
+            _record_result(journal, results[-1])
+
+    _print_summary(results, skipped, time.perf_counter() - start)
+    if any(error is not None for _, error, _ in results):
+        sys.exit(1)
 
 
 if __name__ == '__main__':
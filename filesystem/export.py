@@ -7,11 +7,12 @@ from json import JSONDecodeError
 import os
 import shutil
 import os.path
+import pickle
 import re
 
 from datetime import datetime
 
-from filesystem import util
+from filesystem import snapshot, util
 from structure.project import *
 from structure.subject import *
 
@@ -25,7 +26,7 @@ from structure.subject import *
 # TODO: each sidecar is written with _eeg in the name. make this more agnostic? as well as coordsystem and electrodes
 # TODO: what if there's no session level?
 def export_project(bids_project: BIDSProject, output_path, changes=None, renamed=None, stub=False,
-                   verbose=False, additional_report=""):
+                   verbose=False, additional_report="", sessions=None):
     """
     Exports a BIDSProject to the given file path.
 
@@ -35,6 +36,11 @@ def export_project(bids_project: BIDSProject, output_path, changes=None, renamed
     * If changes is provided as a list, only the file paths specified in changes are overwritten.
     * Changes shouldn't be provided if the output directory is "fresh". If renamed is provided as a dictionary,
     * each key resembles the old filename, and its corresponding value resembles the new filename
+    * If sessions is provided, only the files of the given sessions (and of their subjects) are written. Sidecars
+    * are still written for every session, since consolidating fields may change them
+    * Once every file is written, a snapshot of the project is written at the root of the BIDS study, so it can be
+    * imported again without reading every file, see filesystem.snapshot. Since the events of the sessions that
+    * didn't change aren't in memory, any previous snapshot is removed instead if only some sessions were written
 
     :raises OSError
 
@@ -46,6 +52,7 @@ def export_project(bids_project: BIDSProject, output_path, changes=None, renamed
     :param verbose: If set to True, informational logs are sent to standard out
     :param additional_report: Additional information that should be included with the generation REPORT
                               that's generated with each export.
+    :param sessions: Set of (subject label, session label) pairs that changed since a previous export, if not None
     :return: None
     """
 
@@ -128,9 +135,10 @@ def export_project(bids_project: BIDSProject, output_path, changes=None, renamed
         dir_context = "%s/sub-%s/sub-%s" % (output_path, subject_label, subject_label)
         if not os.path.isdir('%s/sub-%s' % (output_path, subject_label)):
             os.mkdir('%s/sub-%s' % (output_path, subject_label))
-        util.write_tsv({"ses-" + k: v for k, v in subject.sessions.items()},
-                       "%s_sessions.tsv" % dir_context, primary_key="session_id", changes=changes)
-        util.write_json(subject.field_definitions, "%s_sessions.json" % dir_context, changes=changes)
+        if sessions is None or any((subject_label, session_label) in sessions for session_label in subject.sessions):
+            util.write_tsv({"ses-" + k: v for k, v in subject.sessions.items()},
+                           "%s_sessions.tsv" % dir_context, primary_key="session_id", changes=changes)
+            util.write_json(subject.field_definitions, "%s_sessions.json" % dir_context, changes=changes)
         for task_label, task in bids_project.tasks.items():
             try:
                 d = util.read_json('%s_task-%s_eeg.json' % (dir_context, task_label))
@@ -145,6 +153,7 @@ def export_project(bids_project: BIDSProject, output_path, changes=None, renamed
                             "%s_task-%s_eeg.json" % (dir_context, task_label))
         _scrub_renamed_tasks(bids_project.tasks.keys(), output_path, 'sub-%s/' % subject_label)
         for session_label, session in subject.sessions.items():
+            session_changed = sessions is None or (subject_label, session_label) in sessions
             if len(subject.sessions) != 1 or session_label != session_agnostic_token:
                 util.printv("...for session %s" % session_label, verbose)
                 dir_context = "%s/sub-%s/ses-%s/sub-%s_ses-%s" % \
@@ -152,8 +161,9 @@ def export_project(bids_project: BIDSProject, output_path, changes=None, renamed
             if not os.path.isdir(dir_context[:dir_context.rfind('/')]):
                 os.mkdir(dir_context[:dir_context.rfind('/')])
             segmented_dir_context = (dir_context[:dir_context.rfind('/')], dir_context[dir_context.rfind('/') + 1:])
-            util.write_tsv(session.scans, '%s_scans.tsv' % dir_context, primary_key='filename', changes=changes)
-            util.write_json(session.field_definitions, "%s_scans.json" % dir_context, changes=changes)
+            if session_changed:
+                util.write_tsv(session.scans, '%s_scans.tsv' % dir_context, primary_key='filename', changes=changes)
+                util.write_json(session.field_definitions, "%s_scans.json" % dir_context, changes=changes)
             _scrub_renamed_tasks(bids_project.tasks.keys(), output_path,
                                  dir_context[len(output_path) + 1:dir_context.rfind('/')])
             for task_label, task in bids_project.tasks.items():
@@ -172,9 +182,11 @@ def export_project(bids_project: BIDSProject, output_path, changes=None, renamed
 
             if not os.path.isdir("%s/eeg" % segmented_dir_context[0]):
                 os.mkdir('%s/eeg' % segmented_dir_context[0])
-            util.write_json(session.coordsystem, "%s/eeg/%s_coordsystem.json" % segmented_dir_context, changes=changes)
-            util.write_tsv(session.electrodes, "%s/eeg/%s_electrodes.tsv" % segmented_dir_context, primary_key='name',
-                           changes=changes)
+            if session_changed:
+                util.write_json(session.coordsystem, "%s/eeg/%s_coordsystem.json" % segmented_dir_context,
+                                changes=changes)
+                util.write_tsv(session.electrodes, "%s/eeg/%s_electrodes.tsv" % segmented_dir_context,
+                               primary_key='name', changes=changes)
             run_count = 0
 
             for scan_label, scan in session.scans.items():
@@ -184,11 +196,13 @@ def export_project(bids_project: BIDSProject, output_path, changes=None, renamed
                 dir_context = "%s/eeg/%s" % segmented_dir_context
                 task_run_context = "%s_task-%s" % (dir_context, scan.task) + (
                     "_run-%1d" % scan.run if scan.run != 0 else "")
-                util.write_tsv(scan.channels, "%s_channels.tsv" % task_run_context, primary_key='name', changes=changes)
-                util.write_tsv(scan.events, "%s_events.tsv" % task_run_context, changes=changes)
-                if not os.path.exists("%s_eeg.set" % task_run_context) and not stub:
-                    util.printv("Copying scan %s" % scan_label, verbose)
-                    shutil.copy(scan.path, "%s_eeg.set" % task_run_context)
+                if session_changed:
+                    util.write_tsv(scan.channels, "%s_channels.tsv" % task_run_context, primary_key='name',
+                                   changes=changes)
+                    util.write_tsv(scan.events, "%s_events.tsv" % task_run_context, changes=changes)
+                    if not os.path.exists("%s_eeg.set" % task_run_context) and not stub:
+                        util.printv("Copying scan %s" % scan_label, verbose)
+                        shutil.copy(scan.path, "%s_eeg.set" % task_run_context)
                 _scrub_renamed_tasks(bids_project.tasks.keys(), output_path,
                                      dir_context[len(output_path) + 1:dir_context.rfind('/')])
 
@@ -207,6 +221,18 @@ def export_project(bids_project: BIDSProject, output_path, changes=None, renamed
                     util.write_json(
                         task.get_fields(subject_label=subject_label, session_label=session_label, scan_name=scan_label),
                         "%s_eeg.json" % task_run_context)
+
+    if sessions is None or all((subject_label, session_label) in sessions
+                               for subject_label, subject in bids_project.subjects.items()
+                               for session_label in subject.sessions):
+        util.printv("Writing snapshot...", verbose)
+        try:
+            snapshot.write_snapshot(bids_project, output_path)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError) as e:
+            print("[WARNING] Unable to write '%s': %s" % (snapshot.snapshot_filename, e))
+            snapshot.remove_snapshot(output_path)
+    else:
+        snapshot.remove_snapshot(output_path)
     util.printv("...done!", verbose)
 
 
@@ -46,14 +46,14 @@ def replace_fields(bids_path, stub=False):
 
                 for entities in _where(project, change.get('where')):
                     if 'scan' in entities:
-                        project.subjects[entities['subject']].sessions[entities['session']].scans[entities['scan']].channels[channel_label].update(updated)
+                        project.subjects[entities['subject']].sessions[entities['session']].scans[entities['scan']].update_channel(channel_label, updated)
                         change_list.add(
                             "%s/sub-%s/" % (bids_path, entities['subject']) + "%s" % ("ses-%s/" % entities['session'] if (
                                         'session' in entities and entities['session'] != session_agnostic_token) else "") +
                                                                                                    entities['scan'][:entities['scan'].rfind('_')] + "_channels.tsv")
                     elif 'session' in entities:
                         for scan_label, scan in project.subjects[entities['subject']].sessions[entities['session']].scans.items():
-                            scan.channels[channel_label].update(updated)
+                            scan.update_channel(channel_label, updated)
                             change_list.add(
                                 "%s/sub-%s/" % (bids_path, entities['subject']) + "%s" % ("ses-%s/" % entities['session'] if (
                                         'session' in entities and entities['session'] != session_agnostic_token) else "") +
@@ -61,7 +61,7 @@ def replace_fields(bids_path, stub=False):
                     elif 'subject' in entities:
                         for session_label, session in project.subjects[entities['subject']].sessions.items():
                             for scan_label, scan in session.scans.items():
-                                scan.channels[channel_label].update(updated)
+                                scan.update_channel(channel_label, updated)
                                 change_list.add(
                                     "%s/sub-%s/" % (bids_path, entities['subject']) + "%s" % ("ses-%s/" % session_label if session_label != session_agnostic_token else "") +
                                                                                                        scan_label[:scan_label.rfind('_')] + "_channels.tsv")
@@ -0,0 +1,113 @@
+"""
+This module defines BatchJournal, a checkpoint file used to resume an interrupted batch conversion.
+"""
+
+import hashlib
+import json
+import os
+import os.path
+import threading
+
+from datetime import datetime
+
+from filesystem import util
+
+__all__ = ['BatchJournal', 'journal_filename']
+
+journal_filename = 'ess2bids_journal.json'
+
+
+class BatchJournal:
+    """
+    Record of the state of every study of a batch conversion, stored at the root of the batch's output.
+
+    * Each study is recorded under the name of its directory, with one of the states 'pending', 'generating',
+      'exported', or 'failed' (along with its error), its timings, and a fingerprint of its input
+    * The journal is rewritten atomically each time a study changes state, so it survives the batch being killed
+    * A study can be skipped when resuming if it was exported, its input fingerprint didn't change, and its output
+      is still complete
+    * Studies may change state from several threads
+
+    Attributes:
+        path: location of the journal file
+        studies: dictionary of study names, each mapped to its journal entry
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        try:
+            with open(path, 'r') as f:
+                self.studies = json.load(f).get('studies') or dict()
+        except (OSError, ValueError, AttributeError):
+            self.studies = dict()
+
+    @staticmethod
+    def fingerprint(study, options=None):
+        """
+        Computes a fingerprint of the input of a study, without reading the contents of its (large) files
+
+        :param study: Root of the ESS study
+        :param options: Conversion options that change the output of the study, which must be JSON serializable
+        :return: Hex digest covering the options, as well as the path, size, and modification time of every file
+        """
+        digest = hashlib.sha1(json.dumps(options, sort_keys=True).encode('utf-8'))
+        for root, dirs, files in os.walk(study):
+            dirs.sort()
+            for filename in sorted(files):
+                try:
+                    stat = os.stat(os.path.join(root, filename))
+                except OSError:
+                    continue
+                digest.update(('%s\0%d\0%d\n' % (os.path.relpath(os.path.join(root, filename), study),
+                                                 stat.st_size, stat.st_mtime_ns)).encode('utf-8'))
+        return digest.hexdigest()
+
+    def is_complete(self, name, fingerprint, output):
+        """
+        Checks whether a study was already converted from the same input
+
+        :param name: Name of the study
+        :param fingerprint: Current fingerprint of the study's input, see fingerprint()
+        :param output: Root of the study's BIDS output
+        :return: True if the study can be skipped
+        """
+        entry = self.studies.get(name)
+        return bool(entry) and entry.get('state') == 'exported' and entry.get('fingerprint') == fingerprint \
+            and all(os.path.isfile(os.path.join(output, filename))
+                    for filename in ('dataset_description.json', '.bids-validator-config.json'))
+
+    def mark(self, name, state, save=True, **fields):
+        """
+        Changes the state of a study, and saves the journal
+
+        * Entering the 'generating' state resets the error and timings of the previous attempt
+
+        :param name: Name of the study
+        :param state: One of 'pending', 'generating', 'exported', or 'failed'
+        :param save: If set to False, the journal isn't saved until the next call to mark() or save()
+        :param fields: Additional fields of the study's entry, such as 'input', 'fingerprint', 'error' or 'timings'
+        :return:
+        """
+        with self._lock:
+            entry = self.studies.setdefault(name, dict())
+            if state == 'generating':
+                entry.update({'error': None, 'timings': dict(), 'started': datetime.now().isoformat(),
+                              'finished': None})
+            elif state in ('exported', 'failed'):
+                entry['finished'] = datetime.now().isoformat()
+            entry['state'] = state
+            entry.update(fields)
+            if save:
+                self.save()
+
+    def save(self):
+        """
+        Atomically writes the journal to its path
+
+        :raises OSError
+
+        :return:
+        """
+        with self._lock:
+            util.write_json_atomic({'studies': self.studies}, self.path)
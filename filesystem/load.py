@@ -3,9 +3,10 @@ import re
 import sys
 from json import JSONDecodeError
 
-from filesystem import util
+from filesystem import snapshot, util
 from structure.project import *
 from structure.subject import *
+from structure.tables import SharedTable
 from structure.task import *
 
 
@@ -13,13 +14,24 @@ def import_project(path, stub=False) -> BIDSProject:
     """
     Imports a BIDSProject from a given file path.
 
+    * If the BIDS study has a snapshot that's still valid, the project is read from it rather than from every file of
+      the study, see filesystem.snapshot. 'field_replacements.json' is always read from the study
+
     :param path: Points to the top level of a given BIDS study
     :param stub: Should be set to True if the BIDS study doesn't contain any large scan files or ignored files
 
     :return: The resulting BIDSProject
     """
+    bids_project = snapshot.read_snapshot(path)
+    if bids_project is not None:
+        _read_field_replacements(bids_project, path)
+        return bids_project
+
     bids_project = BIDSProject(os.path.basename(path))
 
+    # scans whose '_channels.tsv' files are identical share a single table, see BIDSScan.update_channel()
+    channel_tables = dict()
+
     try:
         bids_project.dataset_description = util.read_json(os.path.join(path, 'dataset_description.json'))
     except JSONDecodeError:
@@ -30,11 +42,7 @@ def import_project(path, stub=False) -> BIDSProject:
         bids_project.subjects[subject_name[4:]] = BIDSSubject()
         bids_project.subjects[subject_name[4:]].fields = subject
 
-    if os.path.exists(os.path.join(path, "field_replacements.json")):
-        try:
-            bids_project.field_replacements = util.read_json(os.path.join(path, "field_replacements.json"))
-        except JSONDecodeError:
-            print("[WARNING] Unable to load 'field_replacements.json', due to a JSON error")
+    _read_field_replacements(bids_project, path)
 
     if os.path.exists(os.path.join(path, "participants.json")):
         try:
@@ -56,8 +64,8 @@ def import_project(path, stub=False) -> BIDSProject:
                 if field:
                     bids_project.tasks[task_name].event_codes = field['EventCodes']
             else:
-                bids_project.tasks[task_name].fields.update(
-                    {"root" + task_specificity_token + k: v for k, v in task_dict.items()})
+                for k, v in task_dict.items():
+                    bids_project.tasks[task_name].add_field(k, v)
         except JSONDecodeError:
             print("[ERROR] Unable to load '%s', due to a JSON error" % task)
             sys.exit(1)
@@ -93,9 +101,8 @@ def import_project(path, stub=False) -> BIDSProject:
                         re.match(r"%s_task-[a-zA-Z0-9]+_.*?\.json" % subject, file)]:
             try:
                 task_name = re.match(r"%s_task-([a-zA-Z0-9]+)_.*?\.json" % subject, sidecar).group(1)
-                bids_project.tasks[task_name].fields.update({subject_label + task_specificity_token + k: v for (k, v) in
-                                                             util.read_json(
-                                                                 os.path.join(path, subject, sidecar)).items()})
+                for k, v in util.read_json(os.path.join(path, subject, sidecar)).items():
+                    bids_project.tasks[task_name].add_field(k, v, subject_label)
             except JSONDecodeError:
                 print("[ERROR] Unable to load '%s', due to a JSON error" % os.path.join(subject, sidecar))
                 sys.exit(1)
@@ -107,10 +114,8 @@ def import_project(path, stub=False) -> BIDSProject:
                                 re.match(r"%s_task-[a-zA-Z0-9]+_.*?\.json" % '_'.join(os.path.split(sub_ses)), file)]:
                     try:
                         task_name = re.search(r"task-([a-zA-Z0-9]+)_", sidecar).group(1)
-                        bids_project.tasks[task_name].fields.update(
-                            {os.path.split(sub_ses)[0] + task_specificity_token + os.path.split(sub_ses)[
-                                1] + task_specificity_token + k: v for (k, v) in
-                             util.read_json(os.path.join(path, sub_ses, sidecar)).items()})
+                        for k, v in util.read_json(os.path.join(path, sub_ses, sidecar)).items():
+                            bids_project.tasks[task_name].add_field(k, v, subject_label, os.path.split(sub_ses)[1][4:])
                     except JSONDecodeError:
                         print("[ERROR] Unable to load '%s', due to a JSON error" % os.path.join(sub_ses, sidecar))
                         sys.exit(1)
@@ -146,13 +151,15 @@ def import_project(path, stub=False) -> BIDSProject:
                         try:
                             task_name = re.match(r"%s_task-([a-zA-Z0-9]+)_.*?\.json" % '_'.join(os.path.split(sub_ses)),
                                                  scan_file).group(1)
-                            bids_project.tasks[task_name].fields.update(
-                                {task_specificity_token.join(
-                                    sub_ses.split('/') + [recording_type + '/' + scan_file, k]): v for (k, v) in
-                                 util.read_json(os.path.join(path, subject, sidecar)).items()})
+                            # sidecars are keyed by the name of their scan, see export_project()
+                            scan_name = "%s/%s.set" % (recording_type, scan_file[:scan_file.rfind('.')])
+                            for k, v in util.read_json(os.path.join(path, sub_ses, recording_type, scan_file)).items():
+                                bids_project.tasks[task_name].add_field(k, v, subject_label,
+                                                                        os.path.split(sub_ses)[1][4:], scan_name)
                         except JSONDecodeError:
-                            print(
-                                "[ERROR] Unable to load '%s', due to a JSON error" % os.path.join(subject, sidecar))
+                            print("[ERROR] Unable to load '%s', due to a JSON error" % os.path.join(sub_ses,
+                                                                                                    recording_type,
+                                                                                                    scan_file))
                             sys.exit(1)
 
             scans_tsv_path = [file for file in os.listdir(os.path.join(path, sub_ses)) if '_scans' in file]
@@ -178,6 +185,11 @@ def import_project(path, stub=False) -> BIDSProject:
             for scan_name, scan in session.scans.items():
                 scan.channels = util.read_tsv(
                     os.path.join(path, sub_ses, scan_name[:scan_name.rfind('_')] + "_channels.tsv"))
+                if scan.channels is not None:
+                    table_key = tuple((name, tuple(row.items())) for name, row in scan.channels.items())
+                    if table_key not in channel_tables:
+                        channel_tables[table_key] = SharedTable(scan.channels)
+                    scan.channels = channel_tables[table_key]
                 scan.events = util.read_tsv(
                     os.path.join(path, sub_ses, scan_name[:scan_name.rfind('_')] + "_events.tsv"), primary_index=None)
 
@@ -192,3 +204,11 @@ def import_project(path, stub=False) -> BIDSProject:
         changes_md.close()
 
     return bids_project
+
+
+def _read_field_replacements(bids_project, path):
+    if os.path.exists(os.path.join(path, "field_replacements.json")):
+        try:
+            bids_project.field_replacements = util.read_json(os.path.join(path, "field_replacements.json"))
+        except JSONDecodeError:
+            print("[WARNING] Unable to load 'field_replacements.json', due to a JSON error")
@@ -0,0 +1,155 @@
+"""
+This module reads and writes snapshots, binary copies of an exported BIDSProject used to import it again quickly.
+"""
+
+import copy
+import hashlib
+import os
+import os.path
+import pickle
+import tempfile
+
+from structure.subject import session_agnostic_token
+
+__all__ = ['snapshot_filename', 'snapshot_version', 'fingerprint_dataset', 'write_snapshot', 'read_snapshot',
+           'remove_snapshot']
+
+snapshot_filename = 'ess2bids_snapshot.pickle'
+
+# bumped whenever the structure of BIDSProject (or of the entities it holds) changes, which invalidates every snapshot
+snapshot_version = 2
+
+# modules whose classes a snapshot may hold, along with the other globals needed to unpickle it
+_snapshot_modules = ('structure.project', 'structure.subject', 'structure.task', 'structure.events',
+                     'structure.tables')
+_snapshot_globals = {('array', 'array'), ('array', '_array_reconstructor')}
+
+# files at the root of a BIDS study that import_project() reads, besides 'field_replacements.json'
+_root_files = ('dataset_description.json', 'participants.tsv', 'participants.json', 'README', 'CHANGES')
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+    # a snapshot is shipped along with the BIDS study, so it may come from anyone. only the classes of BIDS entities
+    # may be unpickled, rather than any callable
+    def find_class(self, module, name):
+        if (module, name) not in _snapshot_globals:
+            if module not in _snapshot_modules:
+                raise pickle.UnpicklingError("'%s.%s' isn't allowed in a snapshot" % (module, name))
+            value = super().find_class(module, name)
+            if not isinstance(value, type) or value.__module__ != module:
+                raise pickle.UnpicklingError("'%s.%s' isn't allowed in a snapshot" % (module, name))
+            return value
+        return super().find_class(module, name)
+
+
+def fingerprint_dataset(path):
+    """
+    Computes a fingerprint of every file of a BIDS study that a snapshot covers, without reading their contents
+
+    * Covers the top level files and sidecars read by import_project(), as well as every file of every subject
+    * Doesn't cover 'field_replacements.json', which is expected to be edited between exports, and is always read
+      again. Nor does it cover files ignored by BIDS, such as 'archived/' or 'REPORT.txt'
+
+    :param path: Root of the BIDS study
+    :return: Hex digest covering the path, size, and modification time of every covered file
+    """
+    digest = hashlib.sha1()
+    for entry in sorted(os.listdir(path)):
+        if entry.startswith('sub-') and os.path.isdir(os.path.join(path, entry)):
+            filenames = list()
+            for root, dirs, files in os.walk(os.path.join(path, entry)):
+                dirs.sort()
+                filenames += [os.path.join(root, filename) for filename in sorted(files)]
+        elif entry in _root_files or (entry.startswith('task-') and entry.endswith('.json')):
+            filenames = [os.path.join(path, entry)]
+        else:
+            continue
+        for filename in filenames:
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            digest.update(('%s\0%d\0%d\n' % (os.path.relpath(filename, path), stat.st_size,
+                                             stat.st_mtime_ns)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def write_snapshot(bids_project, path):
+    """
+    Atomically writes a snapshot of a BIDSProject at the root of the BIDS study it was just exported to
+
+    * Must only be called once every file of the BIDS study was written, since the snapshot is only valid as long as
+      none of the files it covers change, see fingerprint_dataset()
+    * The project must be complete, i.e. hold the events of every scan
+
+    :raises OSError
+    :raises pickle.PicklingError: if the project holds an object that can't be pickled
+
+    :param bids_project: BIDSProject that was exported
+    :param path: Root of the BIDS study
+    :return:
+    """
+    # converter specific state, which may refer to the ESS study, isn't part of the snapshot
+    bids_project = copy.copy(bids_project)
+    bids_project.original_path = ""
+    bids_project.ignored_files = list()
+    bids_project.source_manifest = None
+
+    handle, temp_path = tempfile.mkstemp(dir=path, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            # the header is a separate pickle, so that a stale snapshot is detected without loading the project
+            pickle.dump((snapshot_version, fingerprint_dataset(path)), f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(bids_project, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, os.path.join(path, snapshot_filename))
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def read_snapshot(path):
+    """
+    Reads the snapshot of a BIDS study, if it's still valid
+
+    * A snapshot is valid if it was written by the same snapshot_version, and none of the files it covers were added,
+      removed or modified since, see fingerprint_dataset()
+    * Only the classes of BIDS entities are unpickled, so a snapshot can't run arbitrary code
+    * The paths of the scans are those of the BIDS study, as if they were imported from it. Converter specific
+      state, such as ignored files and field replacements, isn't kept
+
+    :param path: Root of the BIDS study
+    :return: The BIDSProject of the snapshot, or None if there's no valid snapshot
+    """
+    try:
+        with open(os.path.join(path, snapshot_filename), 'rb') as f:
+            if _SnapshotUnpickler(f).load() != (snapshot_version, fingerprint_dataset(path)):
+                return None
+            bids_project = _SnapshotUnpickler(f).load()
+    except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+
+    bids_project.project_name = os.path.basename(path)
+    bids_project.field_replacements = {'channels': dict(), 'tasks': dict()}
+
+    for subject_label, subject in bids_project.subjects.items():
+        for session_label, session in subject.sessions.items():
+            sub_ses = "sub-%s" % subject_label
+            if len(subject.sessions) != 1 or session_label != session_agnostic_token:
+                sub_ses = os.path.join(sub_ses, "ses-%s" % session_label)
+            for scan_name, scan in session.scans.items():
+                scan.path = os.path.join(path, sub_ses, scan_name)
+
+    return bids_project
+
+
+def remove_snapshot(path):
+    """
+    Removes the snapshot of a BIDS study, if there's one
+
+    :param path: Root of the BIDS study
+    :return:
+    """
+    try:
+        os.remove(os.path.join(path, snapshot_filename))
+    except FileNotFoundError:
+        pass
@@ -6,8 +6,11 @@ It also contains a 'file_extensions' list, which contains all legal file extensi
 """
 
 import json
+import os
 import os.path
+import tempfile
 from typing import *
+from collections.abc import Mapping
 
 common_extensions = ['.json', '.tsv', '', '.md']
 
@@ -129,11 +132,39 @@ def write_json(entity: Dict, output_path, changes = None):
     file.close()
 
 
+def write_json_atomic(entity: Dict, output_path, indent=4):
+    """
+    Writes a JSON file atomically, so that it's never left half written, even if the process is killed
+
+    * Unlike write_json(), the file is always written, and its keys are sorted
+
+    :raises OSError
+
+    :param entity: A dictionary that is JSON serializable
+    :param output_path: Destination for file being written, which directory is created if needed
+    :param indent: Indentation of the JSON file
+    :return:
+    """
+    directory = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(directory, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'w') as f:
+            json.dump(entity, f, indent=indent, sort_keys=True)
+        os.replace(temp_path, output_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
 def write_tsv(entity_tree, output_path, primary_key = None, changes = None, default="n/a"):
     """
     Takes a dictionary/list of dictionaries, and then writes it to a .tsv file
 
     * Also takes objects that have 'fields' in their namespace that point to a dictionary.
+    * Any read-only mapping (such as a SharedTable) is accepted wherever a dictionary is
+    * Also takes columnar objects that provide 'tsv_header()' and 'tsv_rows()' (such as BIDSEvents), whose rows are
+      streamed to the file as they are generated
     * If changes are provided, and the output_path isn't featured in the changes list, the function is idempotent.
     * If primary_key isn't provided, and entity_tree is a dictionary, then the keys for entity_tree aren't written to the .tsv
     * If primary_key is provided, each key in the root entity_tree will be written under the column specified as the value for 'primary_key'
@@ -150,14 +181,22 @@ def write_tsv(entity_tree, output_path, primary_key = None, changes = None, defa
     """
 
     if not is_changed(output_path, changes) or not bool(entity_tree): return
+
+    if hasattr(entity_tree, 'tsv_rows'):
+        file = open(output_path, "w")
+        file.write("\t".join(entity_tree.tsv_header()))
+        file.writelines("\n" + "\t".join(row) for row in entity_tree.tsv_rows(default))
+        file.close()
+        return
+
     header = []
 
     for key in entity_tree:
         fields = dict()
-        if isinstance(entity_tree, dict):
+        if isinstance(entity_tree, Mapping):
             if hasattr(entity_tree[key], 'fields'):
                 fields = entity_tree[key].fields
-            elif isinstance(entity_tree[key], dict):
+            elif isinstance(entity_tree[key], Mapping):
                 fields = entity_tree[key]
             header += [i for i in list(fields.keys()) if i not in header]
         elif isinstance(entity_tree, list):
@@ -174,10 +213,10 @@ def write_tsv(entity_tree, output_path, primary_key = None, changes = None, defa
 
     for key in entity_tree:
         fields = dict()
-        if isinstance(entity_tree, dict):
+        if isinstance(entity_tree, Mapping):
             if hasattr(entity_tree[key], 'fields'):
                 fields = entity_tree[key].fields
-            elif isinstance(entity_tree[key], dict):
+            elif isinstance(entity_tree[key], Mapping):
                 fields = entity_tree[key]
             file.write("\n" + (key + "\t" if primary_key else "") + "\t".join([str(fields[k]) if k in fields else default for k in header]))
         else:
@@ -3,4 +3,4 @@ This package contains self-defined data structures that are mapped
 to many entities in a BIDS study.
 """
 
-__all__ = ["project", "subject", "task"]
\ No newline at end of file
+__all__ = ["project", "subject", "task", "events", "tables"]
\ No newline at end of file
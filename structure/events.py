@@ -0,0 +1,126 @@
+"""
+This module defines the BIDSEvents class, a compact container for the entries of an '_events.tsv' file
+"""
+
+import math
+
+from array import array
+
+__all__ = ['BIDSEvents']
+
+
+class BIDSEvents:
+    """
+    Columnar storage of the events of a scan, which holds no Python object per event
+
+    * Onsets are stored as doubles, and are written back exactly as they were appended. Onsets are written with as
+      many decimals as the first onset, and only onsets with another number of decimals hold their own. Onsets that
+      a double doesn't hold exactly as written (e.g. too many digits, leading zeros, exponents) are kept as text
+    * Event codes are stored once each, and every event only holds the index of its code
+    * HED tags are stored once per event code. Only events whose tags differ from the other events of their code
+      hold their own tags
+    * Iterating over BIDSEvents yields a dictionary per event, just like the list of dictionaries it replaces,
+      while write_tsv() streams its rows without building them
+
+    Attributes:
+        onsets: onset of each event, in seconds
+        code_indices: index of the event code of each event within codes
+        codes: every distinct event code, in order of appearance
+        hed_tags: dictionary of event codes, each mapped to the HED tags of its events (or None)
+    """
+
+    def __init__(self):
+        self.onsets = array('d')
+        self.code_indices = array('I')
+        self.codes = list()
+        self.hed_tags = dict()
+        self._code_index = dict()
+        self._decimals = None
+        self._onset_decimals = dict()
+        self._onset_text = dict()
+        self._hed_overrides = dict()
+
+    def append(self, onset, event_code, hed=None):
+        """
+        Adds an event
+
+        :param onset: Onset of the event in seconds, as text
+        :param event_code: Event code of the event
+        :param hed: HED tags of the event, if any
+        :return:
+        """
+        index = len(self.onsets)
+        try:
+            value = float(onset)
+            if not math.isfinite(value):
+                raise ValueError(onset)
+            point = onset.find('.')
+            decimals = len(onset) - point - 1 if point >= 0 else 0
+            if '%.*f' % (decimals, value) != onset:
+                raise ValueError(onset)
+            if self._decimals is None:
+                self._decimals = decimals
+            elif decimals != self._decimals:
+                self._onset_decimals[index] = decimals
+        except ValueError:
+            value = math.nan
+            self._onset_text[index] = onset
+        self.onsets.append(value)
+
+        code_index = self._code_index.get(event_code)
+        if code_index is None:
+            code_index = self._code_index[event_code] = len(self.codes)
+            self.codes.append(event_code)
+            self.hed_tags[event_code] = hed
+        elif self.hed_tags[event_code] != hed:
+            self._hed_overrides[index] = hed
+        self.code_indices.append(code_index)
+
+    def tsv_header(self):
+        """
+        :return: List of the columns of '_events.tsv'
+        """
+        if any(self.hed_tags.values()) or any(self._hed_overrides.values()):
+            return ['onset', 'duration', 'event_code', 'HED']
+        return ['onset', 'duration', 'event_code']
+
+    def tsv_rows(self, default='n/a'):
+        """
+        Generates the rows of '_events.tsv', matching tsv_header()
+
+        :param default: Value of missing HED tags
+        :return: Generator of lists of column values
+        """
+        with_hed = len(self.tsv_header()) == 4
+        for index in range(len(self.onsets)):
+            onset = self._onset(index)
+            code = self.codes[self.code_indices[index]]
+            if not with_hed:
+                yield [onset, 'n/a', code]
+                continue
+            hed = self._hed_overrides[index] if index in self._hed_overrides else self.hed_tags[code]
+            yield [onset, 'n/a', code, hed or default]
+
+    def __len__(self):
+        return len(self.onsets)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.onsets)
+        if not 0 <= index < len(self.onsets):
+            raise IndexError('event index out of range')
+        code = self.codes[self.code_indices[index]]
+        event = {'onset': self._onset(index), 'duration': 'n/a', 'event_code': code}
+        hed = self._hed_overrides[index] if index in self._hed_overrides else self.hed_tags[code]
+        if hed:
+            event['HED'] = hed
+        return event
+
+    def _onset(self, index):
+        if index in self._onset_text:
+            return self._onset_text[index]
+        return '%.*f' % (self._onset_decimals.get(index, self._decimals), self.onsets[index])
+
+    def __iter__(self):
+        for index in range(len(self.onsets)):
+            yield self[index]
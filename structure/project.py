@@ -3,6 +3,7 @@ This module defines the BIDSProject class, as well as several BIDS domain specif
 """
 
 from structure.subject import BIDSSubject
+from structure.tables import index_rows
 from structure.task import BIDSTask
 from typing import Dict
 
@@ -13,6 +14,10 @@ BIDS_version = "1.2.1"
 channel_types = {'AUDIO', 'EEG', 'EOG', 'ECG', 'EMG', 'EYEGAZE', 'GSR', 'HEOG', 'MISC', 'PUPIL',
                  'REF', 'RESP', 'SYSCLOCK', 'TEMP', 'TRIG', 'VEOG'}
 
+# sidecar fields holding the number of channels of a given type
+channel_count_fields = (('EEGChannelCount', 'EEG'), ('EOGChannelCount', 'EOG'), ('ECGChannelCount', 'ECG'),
+                        ('EMGChannelCount', 'EMG'), ('MiscChannelCount', 'MISC'))
+
 
 class BIDSProject:
     """
@@ -32,6 +37,7 @@ class BIDSProject:
         self.event_codes = dict()
         self.field_replacements = {'channels': dict(), 'tasks': dict()}
         self.ignored_files = list()
+        self.source_manifest = None  # record of the input each session was generated from, if any
 
     def init_dataset_description(self, name, bids_license, authors=None, acknowledgements="n/a",
                                  how_to_acknowledge="n/a", funding=None,
@@ -61,26 +67,12 @@ class BIDSProject:
         for subject_name, subject in self.subjects.items():
             for session_name, session in subject.sessions.items():
                 for filename, scan in session.scans.items():
-                    self.tasks[scan.task].add_field("EEGChannelCount", len(
-                        list(filter(lambda x: scan.channels[x]['type'] == 'EEG', scan.channels.keys()))),
-                                                    subject_label=subject_name, session_label=session_name,
-                                                    scan_name=filename)
-                    self.tasks[scan.task].add_field("EOGChannelCount", len(
-                        list(filter(lambda x: scan.channels[x]['type'] == 'EOG', scan.channels.keys()))),
-                                                    subject_label=subject_name, session_label=session_name,
-                                                    scan_name=filename)
-                    self.tasks[scan.task].add_field("ECGChannelCount", len(
-                        list(filter(lambda x: scan.channels[x]['type'] == 'ECG', scan.channels.keys()))),
-                                                    subject_label=subject_name, session_label=session_name,
-                                                    scan_name=filename)
-                    self.tasks[scan.task].add_field("EMGChannelCount", len(
-                        list(filter(lambda x: scan.channels[x]['type'] == 'EMG', scan.channels.keys()))),
-                                                    subject_label=subject_name, session_label=session_name,
-                                                    scan_name=filename)
-                    self.tasks[scan.task].add_field("MiscChannelCount", len(
-                        list(filter(lambda x: scan.channels[x]['type'] == 'MISC', scan.channels.keys()))),
-                                                    subject_label=subject_name, session_label=session_name,
-                                                    scan_name=filename)
+                    # channels are grouped by type once per channel table, rather than filtered for every type
+                    channels_by_type = index_rows(scan.channels, 'type')
+                    for field, channel_type in channel_count_fields:
+                        self.tasks[scan.task].add_field(field, len(channels_by_type.get(channel_type, ())),
+                                                        subject_label=subject_name, session_label=session_name,
+                                                        scan_name=filename)
 
         for event_code in self.event_codes:
             for task_name, task in self.tasks.items():
@@ -104,8 +96,7 @@ class BIDSProject:
                     warnings_list.append(
                         "Warning: session %s specifies electrodes, but no coordinate system" % session_name)
                 for filename, scan in session.scans.items():
-                    if list(session.electrodes.keys()) != list(
-                            filter(lambda x: scan.channels[x]['type'] == 'EEG', scan.channels.keys())):
+                    if list(session.electrodes.keys()) != list(index_rows(scan.channels, 'type').get('EEG', ())):
                         warnings_list.append(
                             "Warning: session %s has mismatched electrodes with %s" % (session_name, filename))
 
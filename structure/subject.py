@@ -1,12 +1,47 @@
 """
 This module specifies several classes for different BIDS entities
+
+Entities use slots rather than a dictionary of attributes, and their containers are only created once they're used,
+since the largest projects hold tens of thousands of them
 """
 
 from typing import Dict
 
+from structure.tables import SharedTable
+
 session_agnostic_token = '.'
 
 
+class _LazyContainer:
+    """
+    Attribute holding a container that's only created once it's first accessed, stored in a slot of its instance
+
+    * Most entities never use some of their containers, or replace them as soon as they're created, so creating them
+      up front only wastes memory
+    * Once assigned, any value (including None) is returned as is
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.slot = None
+
+    def __set_name__(self, owner, name):
+        self.slot = '_' + name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        try:
+            return getattr(instance, self.slot)
+        except AttributeError:
+            value = self.factory()
+            setattr(instance, self.slot, value)
+            return value
+
+    def __set__(self, instance, value):
+        setattr(instance, self.slot, value)
+
+
 class BIDSSubject:
     """
     This class defines a Subject entity in BIDS
@@ -19,10 +54,13 @@ class BIDSSubject:
         field_definitions: entries in '_sessions.json' for every session under the subject
     """
 
+    __slots__ = ('sessions', '_fields', '_field_definitions')
+
+    fields = _LazyContainer(dict)  # entries in 'participants.tsv'
+    field_definitions = _LazyContainer(dict)  # entries in '_sessions.json'
+
     def __init__(self):
         self.sessions: Dict[str, BIDSSession] = dict()
-        self.fields = dict()  # entries in 'participants.tsv'
-        self.field_definitions = dict()  # entries in '_sessions.json'
 
 
 class BIDSSession:
@@ -33,16 +71,19 @@ class BIDSSession:
         scans: Aggregate of BIDSScans, each key being the relative filepath from the session
         fields: entries in '_sessions.tsv' for the given session
         field_definitions: entries in '_scans.json' for every scan under the session
-        electrodes: entries in '_electrodes.tsv' for a given session
+        electrodes: entries in '_electrodes.tsv' for a given session, either a dictionary or a SharedTable
         coordsystem: entries in '_coordsystem.json' for a given session
     """
 
+    __slots__ = ('scans', '_fields', '_field_definitions', '_electrodes', '_coordsystem')
+
+    fields = _LazyContainer(dict)
+    field_definitions = _LazyContainer(dict)
+    electrodes = _LazyContainer(dict)
+    coordsystem = _LazyContainer(dict)
+
     def __init__(self):
         self.scans: Dict[str, BIDSScan] = dict()
-        self.fields = dict()
-        self.field_definitions = dict()
-        self.electrodes = dict()
-        self.coordsystem = dict()
 
 
 class BIDSScan:
@@ -54,14 +95,34 @@ class BIDSScan:
         path: original path of the scan file
         run: indexed run of the scan. if 0, then assume there's only one scan
         fields: entries in '_scans.tsv'
-        events: entries in '_events.tsv'
-        channels: entries in '_channels.tsv'
+        events: entries in '_events.tsv', either a list of dictionaries or a BIDSEvents
+        channels: entries in '_channels.tsv', either a dictionary or a SharedTable
     """
 
+    __slots__ = ('task', 'path', 'run', '_fields', '_events', '_channels')
+
+    fields = _LazyContainer(dict)
+    events = _LazyContainer(list)
+    channels = _LazyContainer(dict)
+
     def __init__(self, path, task):
         self.task = task
         self.path = path
         self.run = 0
-        self.fields = dict()
-        self.events = list()
-        self.channels = dict()
+
+    def update_channel(self, channel_label, fields):
+        """
+        Changes the entry of a channel in '_channels.tsv'
+
+        * If the channels are a SharedTable, this scan gets its own copy of the table first, so the other scans
+          sharing the table are left untouched
+
+        :raises KeyError: if the scan has no such channel
+
+        :param channel_label: Label of the channel
+        :param fields: Dictionary of column/value pairs to change
+        :return:
+        """
+        if isinstance(self.channels, SharedTable):
+            self.channels = self.channels.copy()
+        self.channels[channel_label].update(fields)
@@ -0,0 +1,87 @@
+"""
+This module defines the SharedTable class, an immutable table shared by several BIDS entities
+"""
+
+from collections.abc import Mapping
+from types import MappingProxyType
+
+__all__ = ['SharedTable', 'index_rows']
+
+
+class SharedTable(Mapping):
+    """
+    Read-only table of rows, each row being a dictionary of column/value pairs keyed by its name
+
+    * Meant to be shared by every entity built from the same source, such as the channels of every scan or the
+      electrodes of every session that use the same recording parameter set
+    * Rows are read-only views, so a table can't be changed through one of the entities that share it. An entity
+      that needs to change its table should replace it with copy() first, see BIDSScan.update_channel()
+    * Tables can be pickled, and a table shared by several entities is still shared once they're unpickled
+    * Since a table can't change, rows grouped by the values of a column are only computed once, see index()
+    """
+
+    __slots__ = ('_rows', '_indices')
+
+    def __init__(self, rows=None):
+        """
+        :param rows: Dictionary of row names, each mapped to a dictionary of column/value pairs, which is copied
+        """
+        self._rows = {name: MappingProxyType(dict(row)) for name, row in (rows or dict()).items()}
+        self._indices = dict()
+
+    def index(self, column):
+        """
+        Groups the rows of the table by their value in a column, once per column
+
+        :raises KeyError: if a row doesn't have the column
+
+        :param column: Name of the column
+        :return: Dictionary of column values, each mapped to a tuple of the names of the rows holding the value, in
+                 the order of the table. It must not be modified
+        """
+        if column not in self._indices:
+            self._indices[column] = {value: tuple(names) for value, names in index_rows(self._rows, column).items()}
+        return self._indices[column]
+
+    def copy(self):
+        """
+        :return: Dictionary of row names, each mapped to a new dictionary, which can be changed freely
+        """
+        return {name: dict(row) for name, row in self._rows.items()}
+
+    def __getitem__(self, name):
+        return self._rows[name]
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __repr__(self):
+        return 'SharedTable(%r)' % self.copy()
+
+    def __reduce__(self):
+        return SharedTable, (self.copy(),)
+
+
+def index_rows(table, column):
+    """
+    Groups the rows of a table by their value in a column
+
+    * The groups of a SharedTable are computed once and shared by every entity using the table. A table that was
+      copied to be changed (see BIDSScan.update_channel()) is grouped again on each call, so it's never out of date
+
+    :raises KeyError: if a row doesn't have the column
+
+    :param table: Dictionary of row names, each mapped to a dictionary of column/value pairs, or a SharedTable
+    :param column: Name of the column
+    :return: Dictionary of column values, each mapped to a sequence of the names of the rows holding the value, in
+             the order of the table
+    """
+    if isinstance(table, SharedTable):
+        return table.index(column)
+    rows = dict()
+    for name, row in table.items():
+        rows.setdefault(row[column], list()).append(name)
+    return rows
@@ -33,28 +33,113 @@ def _field_order(x):
     return lower + 1
 
 
+def _path(subject_label=None, session_label=None, scan_name=None):
+    # each label is only used if all of the less specific labels are specified
+    if not subject_label:
+        return ()
+    if not session_label:
+        return subject_label,
+    if not scan_name:
+        return subject_label, session_label
+    return subject_label, session_label, scan_name
+
+
+def _flat_key(path, key):
+    return task_specificity_token.join((path or ("root",)) + (key,))
+
+
+class _FieldNode:
+    """
+    Node of the field tree of a BIDSTask, holding the fields of one level of specificity
+
+    Attributes:
+        fields: key/value pairs of the sidecar entries at this level
+        children: child nodes, each key being a subject label, session label, or scan name
+        view: copy of fields returned by BIDSTask.get_fields(), or None once fields changed
+    """
+
+    __slots__ = ('fields', 'children', 'view')
+
+    def __init__(self):
+        self.fields = dict()
+        self.children = dict()
+        self.view = None
+
+
+def _consolidate(node, descendants, keys=None, reverse=True):
+    """
+    Internal function used to move the fields that have the same value in every descendant up to their ancestor
+
+    * Descendants that end up without any field or child are removed from the node
+
+    :param node: _FieldNode receiving the consolidated fields
+    :param descendants: Collection of _FieldNodes below node, which fields are consolidated
+    :param keys: Names of the fields that may be consolidated, or None for every field of the descendants
+    :param reverse: Order in which consolidated fields are added to the node, sorted by name
+    :return:
+    """
+    values = dict()
+    for descendant in descendants:
+        for key, value in descendant.fields.items():
+            if keys is None or key in keys:
+                values.setdefault(key, set()).add(value)
+
+    consolidated = [key for key in sorted(values, reverse=reverse) if len(values[key]) == 1]
+    if not consolidated:
+        return
+
+    for key in consolidated:
+        node.fields[key] = next(iter(values[key]))
+    for descendant in descendants:
+        for key in consolidated:
+            descendant.fields.pop(key, None)
+    _prune(node)
+
+
+def _prune(node):
+    # removes every node below the given node that holds no field, bottom-up
+    for label, child in list(node.children.items()):
+        _prune(child)
+        if not child.fields and not child.children:
+            del node.children[label]
+
+
 class BIDSTask:
     """
     Class that represents a given BIDSTask
 
     * Each field is either project, subject, session, or scan specific
-    * The specificity of a given field is specified in the key of the field
-    * Each key is tokenized using the above-defined token, where the last token is the actual field name
+    * Fields are stored in a tree, each level being indexed by the labels of the subject, session and scan that
+      the fields are specific to, so the fields of a given specificity are found without scanning every field
+    * The fields property provides a flat view of the tree, where each key is tokenized using the above-defined
+      token, and the last token is the actual field name
 
     Attributes:
-        fields: key/value pairs for each sidecar entry
+        fields: key/value pairs for each sidecar entry (read-only)
         event_codes: EEG specific entries in "_events.json"
     """
 
     def __init__(self):
-        self.fields = dict()
+        self._root = _FieldNode()
         self.event_codes = dict()
 
+    @property
+    def fields(self):
+        """
+        Flat view of every field, keyed by their specificity and name joined with task_specificity_token
+
+        * Project-specific fields are keyed by "root", e.g. 'root$TaskName' or '01$02$eeg/scan.set$TaskName'
+        * The view is built on each access, so changing it doesn't change the task
+
+        :return: Dictionary of tokenized keys, each mapped to the value of the field
+        """
+        return {_flat_key(path, key): value for path, node in self._walk() for key, value in node.fields.items()}
+
     def add_field(self, key, value, subject_label=None, session_label=None, scan_name=None):
         """
         Adds a field to a given Task
 
-        * If none of the keyword arguments are specified,
+        * If none of the keyword arguments are specified, the field is project-specific
         * If session_label is specified, subject_label should be specified as well
         * If scan_name is specified, session_label and subject_label should be specified as well
 
@@ -65,18 +150,9 @@ class BIDSTask:
         :param scan_name: the fields's given scan_name, if specified
         :return:
         """
-        if subject_label:
-            if session_label:
-                if scan_name:
-                    self.fields[subject_label + task_specificity_token + session_label + task_specificity_token +
-                                scan_name + task_specificity_token + key] = value
-                else:
-                    self.fields[subject_label + task_specificity_token + session_label +
-                                task_specificity_token + key] = value
-            else:
-                self.fields[subject_label + task_specificity_token + key] = value
-        else:
-            self.fields["root" + task_specificity_token + key] = value
+        node = self._node(_path(subject_label, session_label, scan_name), create=True)
+        node.fields[key] = value
+        node.view = None
 
     def field(self, key, subject_label=None, session_label=None, scan_name=None):
         """
@@ -86,49 +162,67 @@ class BIDSTask:
         * If session_label is specified, subject_label should be specified as well
         * If scan_name is specified, session_label and subject_label should be specified as well
 
+        :raises KeyError: if the field isn't specified at the given specificity
+
         :param key: name of the field
         :param subject_label: the field's given subject_label, if specified
         :param session_label: the field's given session_label, if specified
         :param scan_name: the fields's given scan_name, if specified
         :return:
         """
-        if subject_label:
-            if session_label:
-                if scan_name:
-                    return self.fields[subject_label + task_specificity_token + session_label +
-                                       task_specificity_token + scan_name + task_specificity_token + key]
-                else:
-                    return self.fields[subject_label + task_specificity_token + session_label +
-                                       task_specificity_token + key]
-            else:
-                return self.fields[subject_label + task_specificity_token + key]
-        else:
-            return self.fields["root" + task_specificity_token + key]
+        path = _path(subject_label, session_label, scan_name)
+        node = self._node(path)
+        if node is None or key not in node.fields:
+            raise KeyError(_flat_key(path, key))
+        return node.fields[key]
 
     def get_fields(self, subject_label=None, session_label=None, scan_name=None):
         """
         Fetches all fields for a given specificity.
 
+        * The fields of each specificity are copied once, and the same copy is returned until a field of that
+          specificity is added, or the fields are preprocessed. The returned dictionary must not be modified
+
         :param subject_label: subject for which fields to fetch
         :param session_label: session for which fields to fetch
         :param scan_name: scan for which fields to fetch
         :return:
         """
-        if subject_label:
-            if session_label:
-                if scan_name:
-                    return {key[key.rfind(task_specificity_token) + 1:]: value for (key, value) in self.fields.items()
-                            if task_specificity_token.join((subject_label, session_label, scan_name)) in key}
-                else:
-                    return {key[key.rfind(task_specificity_token) + 1:]: value for (key, value) in self.fields.items()
-                            if task_specificity_token.join((subject_label, session_label)) in key and
-                            key.count(task_specificity_token) == 2}
-            else:
-                return {key[key.rfind(task_specificity_token) + 1:]: value for (key, value) in self.fields.items()
-                        if subject_label == key.split(task_specificity_token)[0] and
-                        key.count(task_specificity_token) == 1}
-        else:
-            return {key[5:]: value for (key, value) in self.fields.items() if "root" + task_specificity_token in key}
+        node = self._node(_path(subject_label, session_label, scan_name))
+        if node is None:
+            return dict()
+        if node.view is None:
+            node.view = dict(node.fields)
+        return node.view
+
+    def _node(self, path, create=False):
+        """
+        Internal method used to find the node of the tree at a given path
+
+        :param path: Tuple of the labels leading to the node, see _path()
+        :param create: If set to True, missing nodes are created along the path
+        :return: The _FieldNode, or None if it doesn't exist and create is False
+        """
+        node = self._root
+        for label in path:
+            child = node.children.get(label)
+            if child is None:
+                if not create:
+                    return None
+                child = node.children[label] = _FieldNode()
+            node = child
+        return node
+
+    def _walk(self, node=None, path=()):
+        """
+        Internal method used to iterate over the tree, each node coming before its children
+
+        :return: Generator of (path, _FieldNode) pairs
+        """
+        node = node or self._root
+        yield path, node
+        for label, child in node.children.items():
+            yield from self._walk(child, path + (label,))
 
     def preprocess_fields(self):
         """
@@ -137,47 +231,25 @@ class BIDSTask:
         * If all scan-specific fields are the same, make it a session-specific field
         * If all session-specific fields are the same, make it a subject-specific field
         * If all subject-specific fields are the same, make it a project-specific field
+        * Fields are consolidated bottom-up in a single pass over each level of the tree, and a consolidated field
+          replaces the value of a less specific field of the same name
 
         :return:
         """
+        for subject in self._root.children.values():
+            for session in subject.children.values():
+                _consolidate(session, session.children.values())
+            _consolidate(subject, subject.children.values())
+
+        # a field specified by any subject becomes project-specific if it has the same value at every level below the
+        # project, including the sessions and scans that couldn't be consolidated
+        descendants = [node for path, node in self._walk() if path]
+        _consolidate(self._root, descendants, {key for subject in self._root.children.values()
+                                               for key in subject.fields}, reverse=False)
 
-        for subject_label in sorted({k.split(task_specificity_token)[0] for k in self.fields}, reverse=True):
-            for session_label in sorted({k.split(task_specificity_token)[1]
-                                         for k in self.fields if subject_label == k.split(task_specificity_token)[0]},
-                                        reverse=True):
-                for field in sorted({k.split(task_specificity_token)[-1]
-                                     for k in self.fields
-                                     if [subject_label, session_label] == k.split(task_specificity_token)[0:2]
-                                     and k.count(task_specificity_token) == 3}, reverse=True):
-                    scan_fields = {k: v for (k, v) in self.fields.items() if [subject_label, session_label]
-                                   == k.split(task_specificity_token)[0:2] and field in k}
-                    if len(set(scan_fields.values())) == 1:
-                        self.fields[subject_label + task_specificity_token + session_label +
-                                    task_specificity_token + field] = list(scan_fields.values())[0]
-                        for scan in scan_fields:
-                            del self.fields[scan]
-            for field in sorted({k.split(task_specificity_token)[-1]
-                                 for k in self.fields
-                                 if subject_label == k.split(task_specificity_token)[0]
-                                 and k.count(task_specificity_token) == 2}, reverse=True):
-                session_fields = {k: v for (k, v) in self.fields.items()
-                                  if subject_label == k.split(task_specificity_token)[0] and
-                                  k.count(task_specificity_token) == 2 and field in k}
-                if len(set(session_fields.values())) == 1:
-                    self.fields[subject_label + task_specificity_token + field] = list(session_fields.values())[0]
-                    for session in session_fields:
-                        del self.fields[session]
-        for field in sorted({k.split(task_specificity_token)[-1]
-                             for k in self.fields
-                             if k.count(task_specificity_token) == 1 and "root" != k.split(task_specificity_token)[0]}):
-            subject_fields = {k: v for (k, v) in self.fields.items()
-                              if field in k and "root" != k.split(task_specificity_token)[0]}
-            if len(set(subject_fields.values())) == 1:
-                self.fields["root" + task_specificity_token + field] = list(subject_fields.values())[0]
-                for subject in subject_fields:
-                    del self.fields[subject]
-
-        self.fields = {k: self.fields[k] for k in sorted(self.fields, key=_field_order)}
+        for path, node in self._walk():
+            node.fields = {k: node.fields[k] for k in sorted(node.fields, key=_field_order)}
+            node.view = None
 
     def fill_na(self, modality=None):
         """
@@ -186,11 +258,10 @@ class BIDSTask:
         :param modality: If specified, also stubs modality-specific task fields
         :return:
         """
-        fully_consolidated = [k.split(task_specificity_token)[-1]
-                              for k in self.fields.keys() if k.split(task_specificity_token)[-1] not in self.fields]
-        remaining_fields = [k for k in valid_fields if k not in fully_consolidated]
+        specified = {key for path, node in self._walk() for key in node.fields}
+        remaining_fields = [k for k in valid_fields if k not in specified]
         if modality and modality in modalities:
-            remaining_fields += [k for k in modalities[modality] if k not in fully_consolidated]
+            remaining_fields += [k for k in modalities[modality] if k not in specified]
 
         for field in remaining_fields:
-            self.fields[field] = "n/a"
+            self.add_field(field, "n/a")
@@ -0,0 +1,9 @@
+"""
+Shared configuration of the test suite, which is run from the root of the repository with 'python -m pytest'
+"""
+
+import os.path
+import sys
+
+# modules of the converter are imported from the root of the repository, just like the scripts do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
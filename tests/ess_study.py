@@ -0,0 +1,88 @@
+"""
+Helpers that write small ESS studies, used by the tests that run the converter end to end
+"""
+
+import os
+import os.path
+
+channels = ['Fz', 'Cz', 'Pz', 'EXG1']
+non_scalp_channels = ['EXG1']
+tasks = ('rest_state', 'oddball')
+
+
+def write_study(root, sessions, events=20):
+    """
+    Writes an ESS study with one recording per session, all sharing the recording parameter set 'RPS_A'
+
+    * Recordings aren't valid '.set' files, so the study must be converted with the 'fake' channel extractor
+    * Sessions are written to 'study_description.xml' in the given order
+    * Recordings and event instance files that already exist are left untouched, so that writing a study again with
+      more sessions only changes the input of the new sessions
+
+    :param root: Root of the ESS study, which is created if needed
+    :param sessions: List of (session number, subject lab ID, task label) tuples
+    :param events: Number of events in each event instance file
+    :return: root
+    """
+    xml = ['<?xml version="1.0" encoding="UTF-8"?>', '<studyLevel1>', '<title>Test Study</title>',
+           '<description>Study used by the tests</description>', '<uuid>test-uuid</uuid>', '<rootURI>.</rootURI>',
+           '<project><funding><organization>NA</organization></funding></project>',
+           '<summary><license><type>CC0</type><text></text><link>NaN</link></license></summary>', '<sessions>']
+
+    for number, lab_id, task in sessions:
+        directory = os.path.join(root, 'session', str(number))
+        os.makedirs(directory, exist_ok=True)
+        if not os.path.exists(os.path.join(directory, 'rec_%d.set' % number)):
+            write_recording(root, number)
+            write_events(root, number, events)
+        xml.append('<session><number>%d</number><taskLabel>%s</taskLabel><labId>NA</labId>' % (number, task))
+        xml.append('<subject><labId>%s</labId><inSessionNumber>1</inSessionNumber><group>g</group><gender>M</gender>'
+                   '<YOB>1990</YOB><age>30</age><hand>R</hand><vision>NA</vision><hearing></hearing>'
+                   '<height>180</height><weight>70</weight><medication><caffeine>NA</caffeine>'
+                   '<alcohol>No</alcohol></medication><channelLocations>NA</channelLocations></subject>' % lab_id)
+        xml.append('<dataRecordings><dataRecording><filename>rec_%d.set</filename>'
+                   '<dataRecordingUuid>uuid-%d</dataRecordingUuid><startDateTime>2019-01-01T00:00:00</startDateTime>'
+                   '<recordingParameterSetLabel>RPS_A</recordingParameterSetLabel>'
+                   '<eventInstanceFile>ev_%d.tsv</eventInstanceFile>'
+                   '<originalFileNameAndPath>NA</originalFileNameAndPath></dataRecording></dataRecordings>'
+                   '</session>' % (number, number, number))
+
+    xml.append('</sessions><tasks>')
+    for task in tasks:
+        xml.append('<task><taskLabel>%s</taskLabel><tag>NA</tag><description>%s task</description></task>'
+                   % (task, task))
+    xml.append('</tasks><recordingParameterSets><recordingParameterSet>'
+               '<recordingParameterSetLabel>RPS_A</recordingParameterSetLabel><channelType><modality><type>EEG</type>'
+               '<samplingRate>256</samplingRate><name>Cap</name><description>NA</description>'
+               '<startChannel>1</startChannel><endChannel>%d</endChannel>'
+               '<subjectInSessionNumber>1</subjectInSessionNumber><referenceLocation>NA</referenceLocation>'
+               '<referenceLabel>Cz</referenceLabel><channelLocationType>10-20</channelLocationType>'
+               '<channelLabel>%s</channelLabel><nonScalpChannelLabel>%s</nonScalpChannelLabel></modality>'
+               '</channelType></recordingParameterSet></recordingParameterSets><eventCodes>'
+               % (len(channels), ', '.join(channels), ', '.join(non_scalp_channels)))
+    for task in tasks:
+        for code in ('1', '2'):
+            xml.append('<eventCode><code>%s</code><taskLabel>%s</taskLabel><numberOfInstances>5</numberOfInstances>'
+                       '<condition><tag>/Event/Code%s</tag><label>c%s</label><description>NA</description>'
+                       '</condition></eventCode>' % (code, task, code, code))
+    xml.append('</eventCodes></studyLevel1>')
+
+    with open(os.path.join(root, 'study_description.xml'), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(xml))
+    os.makedirs(os.path.join(root, 'additional_documentation'), exist_ok=True)
+    return root
+
+
+def write_recording(root, number):
+    with open(os.path.join(root, 'session', str(number), 'rec_%d.set' % number), 'wb') as f:
+        f.write(b'recording %d' % number)
+
+
+def write_events(root, number, events, offset=0.0):
+    """
+    Writes the event instance file of a session, whose onsets are shifted by offset
+    """
+    with open(os.path.join(root, 'session', str(number), 'ev_%d.tsv' % number), 'w') as f:
+        for i in range(events):
+            code = '1' if i % 3 else '2'
+            f.write('%s\t%.4f\t/Event/Code%s,/Extra/Tag%d\n' % (code, offset + i * 0.5, code, i % 3))
@@ -0,0 +1,92 @@
+"""
+Tests of utilities.disk_cache, and of the caches created from 'config.json'
+"""
+
+import argparse
+import os
+
+import ess2bids
+from utilities.disk_cache import DiskCache
+
+megabyte = 1024 * 1024
+
+
+def _entries(cache):
+    return sorted(entry for entry in os.listdir(cache.path) if entry.endswith('.pickle'))
+
+
+def _age(cache, key, seconds):
+    # backdates an entry, since several entries written within the same tick may share their modification time
+    path = cache._entry_path(key)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - seconds * 1000000000))
+
+
+def test_round_trip(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    cache.put(('channels', 'a'), [['Fz'], ['EEG']])
+    assert cache.get(('channels', 'a')) == [['Fz'], ['EEG']]
+    assert cache.get(('channels', 'b'), 'missing') == 'missing'
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = DiskCache(str(tmp_path), max_size=int(2.5 * megabyte))
+    cache.put('c', b'x' * megabyte)
+    _age(cache, 'c', 20)
+    cache.put('b', b'x' * megabyte)
+    _age(cache, 'b', 10)
+    cache.put('a', b'x' * megabyte)
+    assert len(_entries(cache)) == 2
+    assert cache.get('c') is None
+    assert cache.get('b') is not None and cache.get('a') is not None
+
+    # reading an entry refreshes it, so the least recently read entry is evicted next
+    _age(cache, 'a', 100)
+    _age(cache, 'b', 200)
+    assert cache.get('b') is not None
+    cache.put('d', b'x' * megabyte)
+    assert cache.get('a') is None
+    assert cache.get('b') is not None and cache.get('d') is not None
+
+
+def test_truncated_entry_is_a_miss(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    cache.put('key', list(range(1000)))
+    path = cache._entry_path('key')
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) // 2)
+    assert cache.get('key', 'missing') == 'missing'
+
+    with open(path, 'wb') as f:
+        f.write(b'not a pickle')
+    assert cache.get('key') is None
+
+    cache.put('key', 'rewritten')
+    assert cache.get('key') == 'rewritten'
+
+
+def test_entry_of_another_key_is_a_miss(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    cache.put('key', 'value')
+    os.replace(cache._entry_path('key'), cache._entry_path('other'))
+    assert cache.get('other') is None
+
+
+def test_configured_sizes(tmp_path):
+    config = {'cache_path': str(tmp_path), 'channel_cache_size': 1, 'description_cache_size': 2}
+    args = argparse.Namespace(no_channel_cache=False, no_description_cache=False)
+    caches = ess2bids._create_caches(config, args)
+    assert caches['channels'].max_size == megabyte
+    assert caches['descriptions'].max_size == 2 * megabyte
+
+    for name, cache in caches.items():
+        for i in range(4):
+            cache.put((name, i), b'x' * (megabyte // 2))
+            _age(cache, (name, i), 10 * (4 - i))
+        cache.put((name, 'last'), b'x' * (megabyte // 2))
+        assert sum(os.path.getsize(os.path.join(cache.path, entry)) for entry in _entries(cache)) <= cache.max_size
+        assert cache.get((name, 'last')) is not None
+        assert cache.get((name, 0)) is None
+
+    args = argparse.Namespace(no_channel_cache=True, no_description_cache=True)
+    assert ess2bids._create_caches(config, args) == {'channels': None, 'descriptions': None}
@@ -0,0 +1,40 @@
+"""
+Tests of structure.events, through reading event instance files and writing '_events.tsv'
+"""
+
+import pytest
+
+from ess.events import read_event_instances
+from filesystem import util
+from structure.events import BIDSEvents
+
+onsets = ['0', '1.5', '2.25', '3.125', '4.50', '5', '6.0', '7.333333333333333', '0.1234567890123456789',
+          '12345678901234567890.5', '1e3', '01.5', '.5', '+2.0', '-0.25', 'NaN', 'inf', 'n/a', '']
+
+
+def _read_onsets(path):
+    with open(path) as f:
+        return [line.split('\t')[0] for line in f.read().split('\n')[1:]]
+
+
+@pytest.mark.parametrize('first', ['1.5', '2', '0.000'])
+def test_onsets_are_written_as_read(tmp_path, first):
+    expected = [first] + onsets
+    with open(str(tmp_path / 'events.txt'), 'w') as f:
+        f.writelines('%d\t%s\tEvent/Label/Code\n' % (i % 3, onset) for i, onset in enumerate(expected))
+
+    events = read_event_instances(str(tmp_path / 'events.txt'))
+    util.write_tsv(events, str(tmp_path / 'events.tsv'))
+
+    assert _read_onsets(str(tmp_path / 'events.tsv')) == expected
+    assert [event['onset'] for event in events] == expected
+
+
+def test_numeric_onsets_are_stored_as_doubles():
+    events = BIDSEvents()
+    for onset in ('1.5', '2.25', '3', '0.1234567890123456789'):
+        events.append(onset, '1')
+
+    assert list(events.onsets[:3]) == [1.5, 2.25, 3.0]
+    assert events[-1]['onset'] == '0.1234567890123456789'
+    assert events[1] == {'onset': '2.25', 'duration': 'n/a', 'event_code': '1'}
@@ -0,0 +1,97 @@
+"""
+Tests of incremental conversions, which only export the sessions whose input changed since the previous conversion
+"""
+
+import json
+import os
+import os.path
+import sys
+
+import pytest
+
+import ess2bids
+from ess.manifest import manifest_filename
+from ess_study import write_events, write_study
+from filesystem.snapshot import snapshot_filename
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sessions = [(2, 'S2', 'rest_state'), (3, 'S2', 'oddball'), (4, 'S3', 'rest_state')]
+
+
+@pytest.fixture
+def study(tmp_path, monkeypatch):
+    write_study(str(tmp_path / 'input'), sessions)
+    # 'config.json' is read from the working directory
+    monkeypatch.chdir(repository)
+    _convert(monkeypatch, tmp_path)
+    return tmp_path
+
+
+def _convert(monkeypatch, root, *options):
+    monkeypatch.setattr(sys, 'argv', ['ess2bids.py', '-s', '-e', 'fake', '--no-channel-cache',
+                                      '--no-description-cache', *options, str(root / 'input'), str(root / 'output')])
+    ess2bids.main()
+
+
+def _events_files(root):
+    # modification time of every '_events.tsv' of the BIDS study, by path relative to its root
+    output = str(root / 'output')
+    return {os.path.relpath(os.path.join(directory, filename), output): os.stat(os.path.join(directory, filename))
+            .st_mtime_ns for directory, _, filenames in os.walk(output) for filename in filenames
+            if filename.endswith('_events.tsv')}
+
+
+def _read(root, path):
+    with open(str(root / 'output' / path)) as f:
+        return f.read()
+
+
+def test_prepended_session_keeps_labels(study, monkeypatch):
+    with open(str(study / 'output' / manifest_filename)) as f:
+        labels = json.load(f)['sessions']
+    assert labels == {'2': ['01', '01'], '3': ['01', '02'], '4': ['02', '01']}
+    events = _events_files(study)
+
+    # a new subject, and a new session of an existing subject, come first in 'study_description.xml'
+    write_study(str(study / 'input'), [(5, 'S1', 'rest_state'), (1, 'S3', 'oddball')] + sessions)
+    _convert(monkeypatch, study)
+
+    with open(str(study / 'output' / manifest_filename)) as f:
+        manifest = json.load(f)
+    assert manifest['subjects'] == {'S1': '03', 'S2': '01', 'S3': '02'}
+    assert manifest['sessions'] == {**labels, '1': ['02', '02'], '5': ['03', '01']}
+    assert sorted(_read(study, 'participants.tsv').split('\n')[1:]) == ['sub-01\tg\t1990\tS2', 'sub-02\tg\t1990\tS3',
+                                                                         'sub-03\tg\t1990\tS1']
+
+    new_events = _events_files(study)
+    assert {path: new_events[path] for path in events} == events
+    assert sorted(set(new_events) - set(events)) == [
+        os.path.join('sub-02', 'ses-02', 'eeg', 'sub-02_ses-02_task-oddball_run-1_events.tsv'),
+        os.path.join('sub-03', 'ses-01', 'eeg', 'sub-03_ses-01_task-restState_run-1_events.tsv')]
+
+
+def test_only_changed_events_are_written(study, monkeypatch):
+    changed = os.path.join('sub-01', 'ses-02', 'eeg', 'sub-01_ses-02_task-oddball_run-1_events.tsv')
+    events = _events_files(study)
+    assert _read(study, changed).split('\n')[1].startswith('0.0000\t')
+
+    write_events(str(study / 'input'), 3, 20, offset=100.0)
+    _convert(monkeypatch, study)
+
+    new_events = _events_files(study)
+    assert new_events.pop(changed) != events.pop(changed)
+    assert new_events == events
+    assert _read(study, changed).split('\n')[1].startswith('100.0000\t')
+
+
+def test_partial_export_removes_snapshot(study, monkeypatch):
+    assert os.path.isfile(str(study / 'output' / snapshot_filename))
+
+    write_events(str(study / 'input'), 4, 20, offset=100.0)
+    _convert(monkeypatch, study)
+    assert not os.path.exists(str(study / 'output' / snapshot_filename))
+
+    # exporting every session writes it again
+    _convert(monkeypatch, study, '-f')
+    assert os.path.isfile(str(study / 'output' / snapshot_filename))
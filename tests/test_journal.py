@@ -0,0 +1,115 @@
+"""
+Tests of filesystem.journal, and of resuming an interrupted batch conversion with 'ess2bids.py -b -r'
+"""
+
+import json
+import os
+import os.path
+import sys
+
+import pytest
+
+import ess2bids
+from ess_study import write_events, write_study
+from filesystem.journal import BatchJournal, journal_filename
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def batch(tmp_path, monkeypatch):
+    for name, lab_id in (('studyA', 'S1'), ('studyB', 'S2')):
+        write_study(str(tmp_path / 'input' / name), [(1, lab_id, 'rest_state'), (2, lab_id, 'oddball')])
+    # 'config.json' is read from the working directory
+    monkeypatch.chdir(repository)
+    return tmp_path
+
+
+def _convert(monkeypatch, batch, *options):
+    converted = list()
+    convert_study = ess2bids._convert_study
+
+    def recording_convert_study(study, *args, **kwargs):
+        converted.append(os.path.basename(study))
+        return convert_study(study, *args, **kwargs)
+
+    monkeypatch.setattr(ess2bids, '_convert_study', recording_convert_study)
+    monkeypatch.setattr(sys, 'argv', ['ess2bids.py', '-b', '-s', '-e', 'fake', '--no-channel-cache',
+                                      '--no-description-cache', *options, str(batch / 'input'), str(batch / 'output')])
+    ess2bids.main()
+    return converted
+
+
+def _states(batch):
+    with open(str(batch / 'output' / journal_filename)) as f:
+        return {name: entry['state'] for name, entry in json.load(f)['studies'].items()}
+
+
+def test_resume_after_interruption(batch, monkeypatch):
+    convert_study = ess2bids._convert_study
+    started = list()
+
+    def interrupted_convert_study(study, *args, **kwargs):
+        started.append(os.path.basename(study))
+        if len(started) == 2:
+            raise KeyboardInterrupt
+        return convert_study(study, *args, **kwargs)
+
+    monkeypatch.setattr(ess2bids, '_convert_study', interrupted_convert_study)
+    monkeypatch.setattr(sys, 'argv', ['ess2bids.py', '-b', '-s', '-e', 'fake', '--no-channel-cache',
+                                      '--no-description-cache', str(batch / 'input'), str(batch / 'output')])
+    with pytest.raises(KeyboardInterrupt):
+        ess2bids.main()
+    completed, interrupted = started
+    assert _states(batch) == {completed: 'exported', interrupted: 'generating'}
+    monkeypatch.setattr(ess2bids, '_convert_study', convert_study)
+
+    assert _convert(monkeypatch, batch, '-r') == [interrupted]
+    assert _states(batch) == {completed: 'exported', interrupted: 'exported'}
+    assert os.path.isfile(str(batch / 'output' / interrupted / 'sub-01' / 'ses-01' / 'sub-01_ses-01_scans.tsv'))
+
+    # every study is complete, so resuming again converts nothing
+    assert _convert(monkeypatch, batch, '-r') == []
+
+    # without --resume, every study is converted again
+    assert sorted(_convert(monkeypatch, batch)) == ['studyA', 'studyB']
+
+
+def test_changed_input_is_converted_again(batch, monkeypatch):
+    assert sorted(_convert(monkeypatch, batch)) == ['studyA', 'studyB']
+
+    write_events(str(batch / 'input' / 'studyB'), 2, 25)
+    assert _convert(monkeypatch, batch, '-r') == ['studyB']
+
+    # an incomplete output is converted again, even if its input didn't change
+    os.remove(str(batch / 'output' / 'studyA' / 'dataset_description.json'))
+    assert _convert(monkeypatch, batch, '-r') == ['studyA']
+
+
+def test_fingerprint(tmp_path):
+    study = write_study(str(tmp_path / 'study'), [(1, 'S1', 'rest_state')])
+    fingerprint = BatchJournal.fingerprint(study, {'stub': True})
+    assert BatchJournal.fingerprint(study, {'stub': True}) == fingerprint
+    assert BatchJournal.fingerprint(study, {'stub': False}) != fingerprint
+
+    write_events(study, 1, 21)
+    assert BatchJournal.fingerprint(study, {'stub': True}) != fingerprint
+
+
+def test_save_is_atomic_and_reloaded(tmp_path):
+    path = str(tmp_path / 'output' / journal_filename)
+    journal = BatchJournal(path)
+    journal.mark('study', 'pending', input='/input/study', fingerprint='abc')
+    journal.mark('study', 'generating')
+    journal.mark('study', 'failed', error='OSError: disk full', timings={'generation': 1.5})
+    assert os.listdir(str(tmp_path / 'output')) == [journal_filename]
+
+    entry = BatchJournal(path).studies['study']
+    assert entry['state'] == 'failed' and entry['error'] == 'OSError: disk full'
+    assert entry['fingerprint'] == 'abc' and entry['timings'] == {'generation': 1.5}
+    assert entry['started'] is not None and entry['finished'] is not None
+
+    # a journal that can't be read starts empty, rather than failing the batch
+    with open(path, 'w') as f:
+        f.write('{"studies": ')
+    assert BatchJournal(path).studies == dict()
@@ -0,0 +1,56 @@
+"""
+Tests of pipelined batch conversions, with 'ess2bids.py -b -p'
+"""
+
+import os
+import os.path
+import sys
+import threading
+
+import pytest
+
+import ess2bids
+from ess_study import write_study
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def batch(tmp_path, monkeypatch):
+    for name, lab_id in (('studyA', 'S1'), ('studyB', 'S2'), ('studyC', 'S3')):
+        write_study(str(tmp_path / 'input' / name), [(1, lab_id, 'rest_state')])
+    # 'config.json' is read from the working directory
+    monkeypatch.chdir(repository)
+    monkeypatch.setattr(sys, 'argv', ['ess2bids.py', '-b', '-p', '-s', '-e', 'fake', '--no-channel-cache',
+                                      '--no-description-cache', str(tmp_path / 'input'), str(tmp_path / 'output')])
+    return tmp_path
+
+
+def test_pipelined_batch(batch):
+    ess2bids.main()
+    for name in ('studyA', 'studyB', 'studyC'):
+        assert os.path.isfile(str(batch / 'output' / name / 'dataset_description.json'))
+
+
+def test_export_thread_error_is_raised(batch, monkeypatch):
+    def failing_record_result(journal, result):
+        raise OSError('No space left on device')
+
+    monkeypatch.setattr(ess2bids, '_record_result', failing_record_result)
+    monkeypatch.setattr(ess2bids, 'exporter_poll_interval', 0.05)
+
+    # the export thread dies on the first study, while the queue of generated studies is full. main() is run in a
+    # thread so that a deadlock fails the test, rather than hanging it
+    raised = list()
+
+    def convert():
+        try:
+            ess2bids.main()
+        except BaseException as e:
+            raised.append(e)
+
+    thread = threading.Thread(target=convert, daemon=True)
+    thread.start()
+    thread.join(timeout=60)
+    assert not thread.is_alive()
+    assert len(raised) == 1 and isinstance(raised[0], OSError) and str(raised[0]) == 'No space left on device'
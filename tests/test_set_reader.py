@@ -0,0 +1,100 @@
+"""
+Tests of utilities.set_reader, on small '.set' files written in every MAT-file layout that EEGLAB saves
+"""
+
+import struct
+
+import pytest
+
+from utilities.set_reader import SetFileError, read_channel_locations
+
+np = pytest.importorskip('numpy')
+
+# Fz and Cz are scalp channels, EXG1 is a non-scalp channel without a type, and Oz has no coordinates
+channels = [('Fz', 'EEG', 0.0, 85.0, -1.5), ('Cz', 'EEG', 0.0, 0.0, 85.0), ('EXG1', '', 12.25, -3.0, 0.0),
+            ('Oz', 'EEG', None, None, None)]
+
+expected = (['Fz', 'Cz', 'EXG1', 'Oz'], ['EEG', 'EEG', '', 'EEG'], [0.0, 0.0, 12.25, 'n/a'],
+            [85.0, 0.0, -3.0, 'n/a'], [-1.5, 85.0, 0.0, 'n/a'])
+
+
+def _chanlocs_v5():
+    chanlocs = np.zeros((1, len(channels)), dtype=[('labels', 'O'), ('type', 'O'), ('theta', 'O'), ('X', 'O'),
+                                                   ('Y', 'O'), ('Z', 'O')])
+    for i, (label, channel_type, x, y, z) in enumerate(channels):
+        coordinates = [np.zeros((0, 0)) if value is None else value for value in (x, y, z)]
+        chanlocs[0, i] = (label, channel_type, 30.0 * i, *coordinates)
+    return chanlocs
+
+
+def _write_v5(path, compressed, top_level_chanlocs=False):
+    sio = pytest.importorskip('scipy.io')
+    variables = {'EEG': {'setname': 'test', 'nbchan': len(channels), 'data': np.zeros((len(channels), 64)),
+                         'chanlocs': _chanlocs_v5()}}
+    if top_level_chanlocs:
+        variables = {'data': np.zeros((len(channels), 64)), 'chanlocs': _chanlocs_v5()}
+    sio.savemat(str(path), variables, do_compression=compressed)
+
+
+def _write_v73(path):
+    # mirrors how MATLAB saves a struct array with '-v7.3': every field of 'chanlocs' is an array of references to
+    # the values of each channel, which are stored in '#refs#'
+    h5py = pytest.importorskip('h5py')
+
+    with h5py.File(str(path), 'w', userblock_size=512) as f:
+        refs = f.create_group('#refs#')
+        eeg = f.create_group('EEG')
+        eeg.attrs['MATLAB_class'] = np.bytes_('struct')
+        eeg.create_dataset('data', data=np.zeros((64, len(channels)))).attrs['MATLAB_class'] = np.bytes_('double')
+        chanlocs = eeg.create_group('chanlocs')
+        chanlocs.attrs['MATLAB_class'] = np.bytes_('struct')
+
+        def store(name, value):
+            if value is None or value == '':
+                dataset = refs.create_dataset(name, data=np.zeros(2, dtype='uint64'))
+                dataset.attrs['MATLAB_empty'] = np.uint8(1)
+                dataset.attrs['MATLAB_class'] = np.bytes_('char' if value == '' else 'double')
+            elif isinstance(value, str):
+                dataset = refs.create_dataset(name, data=np.array([[ord(c)] for c in value], dtype='uint16'))
+                dataset.attrs['MATLAB_class'] = np.bytes_('char')
+            else:
+                dataset = refs.create_dataset(name, data=np.array([[value]]))
+                dataset.attrs['MATLAB_class'] = np.bytes_('double')
+            return dataset.ref
+
+        for j, field in enumerate(('labels', 'type', 'X', 'Y', 'Z')):
+            references = [store('%s_%d' % (field, i), channel[j]) for i, channel in enumerate(channels)]
+            chanlocs.create_dataset(field, data=np.array([references], dtype=h5py.ref_dtype).T)
+
+    header = b'MATLAB 7.3 MAT-file, Platform: GLNXA64, Created on: Mon Jan  1 00:00:00 2024 HDF5 schema 1.00 .'
+    with open(str(path), 'r+b') as f:
+        f.write(header.ljust(116) + b'\x00' * 8 + struct.pack('<H', 0x0200) + b'IM')
+
+
+@pytest.mark.parametrize('compressed', [True, False], ids=['compressed', 'uncompressed'])
+def test_v5(tmp_path, compressed):
+    _write_v5(tmp_path / 'recording.set', compressed)
+    assert read_channel_locations('recording.set', str(tmp_path)) == expected
+
+
+def test_v5_top_level_chanlocs(tmp_path):
+    _write_v5(tmp_path / 'recording.set', True, top_level_chanlocs=True)
+    assert read_channel_locations('recording.set', str(tmp_path)) == expected
+
+
+def test_v73(tmp_path):
+    _write_v73(tmp_path / 'recording.set')
+    assert read_channel_locations('recording.set', str(tmp_path)) == expected
+
+
+def test_not_a_mat_file(tmp_path):
+    (tmp_path / 'recording.set').write_bytes(b'not a MAT-file' * 16)
+    with pytest.raises(SetFileError):
+        read_channel_locations('recording.set', str(tmp_path))
+
+
+def test_missing_chanlocs(tmp_path):
+    sio = pytest.importorskip('scipy.io')
+    sio.savemat(str(tmp_path / 'recording.set'), {'EEG': {'setname': 'test', 'data': np.zeros((2, 8))}})
+    with pytest.raises(SetFileError):
+        read_channel_locations('recording.set', str(tmp_path))
@@ -0,0 +1,120 @@
+"""
+Tests of filesystem.snapshot, and of finalizing a BIDS study from its snapshot rather than from its files
+"""
+
+import json
+import os
+import os.path
+import pickle
+import shutil
+import sys
+
+import pytest
+
+import ess2bids
+from ess_study import write_study
+from filesystem import field_replacement, load, snapshot
+from structure import task
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# files that differ between two exports of the same project
+_volatile = ('archived', 'REPORT.txt', snapshot.snapshot_filename)
+
+
+class _RunCommand:
+    def __init__(self, command):
+        self.command = command
+
+    def __reduce__(self):
+        return os.system, (self.command,)
+
+
+@pytest.fixture
+def study(tmp_path, monkeypatch):
+    write_study(str(tmp_path / 'input'), [(1, 'S1', 'rest_state'), (2, 'S1', 'oddball'), (3, 'S2', 'rest_state')])
+    # 'config.json' is read from the working directory
+    monkeypatch.chdir(repository)
+    monkeypatch.setattr(sys, 'argv', ['ess2bids.py', '-s', '-e', 'fake', '--no-channel-cache',
+                                      '--no-description-cache', str(tmp_path / 'input'), str(tmp_path / 'output')])
+    ess2bids.main()
+    return str(tmp_path / 'output')
+
+
+def _forbid_tree_walk(monkeypatch):
+    def read_tsv(*args, **kwargs):
+        raise AssertionError('the BIDS study was read file by file')
+
+    monkeypatch.setattr(load.util, 'read_tsv', read_tsv)
+
+
+def _files(path):
+    files = dict()
+    for directory, dirs, filenames in os.walk(path):
+        dirs[:] = [d for d in dirs if d not in _volatile]
+        for filename in filenames:
+            if filename not in _volatile:
+                with open(os.path.join(directory, filename), 'rb') as f:
+                    files[os.path.relpath(os.path.join(directory, filename), path)] = f.read()
+    return files
+
+
+def test_valid_snapshot_is_loaded(study, monkeypatch):
+    _forbid_tree_walk(monkeypatch)
+    project = load.import_project(study, stub=True)
+
+    assert project.project_name == 'output'
+    assert sorted(project.subjects) == ['01', '02']
+    scan = next(iter(project.subjects['01'].sessions['01'].scans.values()))
+    assert scan.path.startswith(os.path.join(study, 'sub-01', 'ses-01', 'eeg'))
+    assert len(scan.events) == 20
+    assert project.field_replacements['channels']['EXG1'][0]['type'] is None
+
+
+def test_stale_snapshot_falls_back_to_tree_walk(study):
+    events = os.path.join(study, 'sub-02', 'ses-01', 'eeg', 'sub-02_ses-01_task-restState_run-1_events.tsv')
+    with open(events, 'a') as f:
+        f.write('\n99.0000\tn/a\t1\t/Event/Code1')
+
+    assert snapshot.read_snapshot(study) is None
+    project = load.import_project(study, stub=True)
+    scan = next(iter(project.subjects['02'].sessions['01'].scans.values()))
+    assert len(scan.events) == 21
+
+
+@pytest.mark.parametrize('payload', [_RunCommand('touch pwned'), eval, shutil.rmtree, load.import_project,
+                                     task._consolidate])
+def test_disallowed_global_is_rejected(study, monkeypatch, payload):
+    monkeypatch.chdir(study)
+    with open(os.path.join(study, snapshot.snapshot_filename), 'wb') as f:
+        pickle.dump((snapshot.snapshot_version, snapshot.fingerprint_dataset(study)), f)
+        pickle.dump(payload, f)
+
+    assert snapshot.read_snapshot(study) is None
+    assert not os.path.exists(os.path.join(study, 'pwned'))
+
+
+def test_finalize_from_snapshot_matches_tree_walk(study, tmp_path, monkeypatch):
+    with open(os.path.join(study, 'field_replacements.json')) as f:
+        replacements = json.load(f)
+    replacements['channels']['EXG1'][0]['type'] = 'MISC'
+    for changes in replacements['tasks'].values():
+        changes[0]['PowerLineFrequency'] = 60
+    with open(os.path.join(study, 'field_replacements.json'), 'w') as f:
+        json.dump(replacements, f)
+
+    from_snapshot, from_files = str(tmp_path / 'from_snapshot'), str(tmp_path / 'from_files')
+    shutil.copytree(study, from_snapshot)
+    shutil.copytree(study, from_files)
+    os.remove(os.path.join(from_files, snapshot.snapshot_filename))
+
+    with monkeypatch.context() as patch:
+        _forbid_tree_walk(patch)
+        field_replacement.replace_fields(from_snapshot, stub=True)
+    field_replacement.replace_fields(from_files, stub=True)
+
+    files = _files(from_snapshot)
+    assert files == _files(from_files)
+    assert b'EXG1\tMISC' in files[os.path.join('sub-01', 'ses-01', 'eeg',
+                                               'sub-01_ses-01_task-restState_run-1_channels.tsv')]
+    assert json.loads(files['task-oddball_eeg.json'])['PowerLineFrequency'] == 60
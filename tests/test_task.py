@@ -0,0 +1,84 @@
+"""
+Tests of structure.task, and of the consolidation of the fields of a BIDSTask
+"""
+
+from structure.task import BIDSTask
+
+# fields of each scan, keyed by (subject label, session label, scan name)
+scan_fields = {
+    ('01', '01', 'eeg/a.set'): {'SamplingFrequency': 256, 'PowerLineFrequency': 60, 'EEGReference': 'Cz',
+                                'RecordingDuration': 10, 'Manufacturer': 'X'},
+    ('01', '01', 'eeg/b.set'): {'SamplingFrequency': 256, 'PowerLineFrequency': 60, 'EEGReference': 'Cz',
+                                'RecordingDuration': 20},
+    ('01', '02', 'eeg/c.set'): {'SamplingFrequency': 512, 'PowerLineFrequency': 60, 'EEGReference': 'Cz',
+                                'RecordingDuration': 10},
+    ('02', '01', 'eeg/d.set'): {'SamplingFrequency': 256, 'PowerLineFrequency': 60, 'EEGReference': 'Fz',
+                                'RecordingDuration': 10, 'Manufacturer': 'X'},
+    ('02', '01', 'eeg/e.set'): {'SamplingFrequency': 256, 'PowerLineFrequency': 60, 'EEGReference': 'Fz',
+                                'RecordingDuration': 10, 'Manufacturer': 'Y'},
+}
+
+
+def _task(scan_fields):
+    task = BIDSTask()
+    task.add_field('TaskName', 'rest')
+    task.add_field('PowerLineFrequency', 50)
+    for (subject, session, scan), fields in scan_fields.items():
+        for key, value in fields.items():
+            task.add_field(key, value, subject, session, scan)
+    task.add_field('CapManufacturer', 'EGI', '01')
+    task.add_field('CapManufacturer', 'EGI', '02')
+    task.add_field('HeadCircumference', 56, '01')
+    task.add_field('EEGGround', 'AFz', '01', '01')
+    task.add_field('EEGGround', 'AFz', '02', '01')
+    task.add_field('EEGGround', 'Fpz', '01', '02')
+    task.preprocess_fields()
+    return task
+
+
+def test_consolidated_fields():
+    task = _task(scan_fields)
+
+    # the consolidated fields of every level, in order, are those of the original implementation
+    assert list(task.get_fields().items()) == [('TaskName', 'rest'), ('PowerLineFrequency', 60),
+                                               ('CapManufacturer', 'EGI'), ('HeadCircumference', 56)]
+    assert list(task.get_fields('01').items()) == [('Manufacturer', 'X'), ('EEGReference', 'Cz'),
+                                                   ('RecordingDuration', 10)]
+    assert list(task.get_fields('02').items()) == [('EEGReference', 'Fz'), ('SamplingFrequency', 256),
+                                                   ('RecordingDuration', 10), ('EEGGround', 'AFz')]
+    assert list(task.get_fields('01', '01').items()) == [('SamplingFrequency', 256), ('EEGGround', 'AFz')]
+    assert list(task.get_fields('01', '02').items()) == [('SamplingFrequency', 512), ('EEGGround', 'Fpz')]
+    assert task.get_fields('02', '01') == dict()
+    assert task.get_fields('01', '01', 'eeg/a.set') == {'RecordingDuration': 10}
+    assert task.get_fields('01', '01', 'eeg/b.set') == {'RecordingDuration': 20}
+    assert task.get_fields('01', '02', 'eeg/c.set') == dict()
+    assert task.get_fields('02', '01', 'eeg/d.set') == {'Manufacturer': 'X'}
+    assert task.get_fields('02', '01', 'eeg/e.set') == {'Manufacturer': 'Y'}
+
+    assert task.fields == {
+        'root$TaskName': 'rest', 'root$PowerLineFrequency': 60, 'root$CapManufacturer': 'EGI',
+        'root$HeadCircumference': 56, '01$Manufacturer': 'X', '01$EEGReference': 'Cz', '01$RecordingDuration': 10,
+        '01$01$SamplingFrequency': 256, '01$01$EEGGround': 'AFz', '01$01$eeg/a.set$RecordingDuration': 10,
+        '01$01$eeg/b.set$RecordingDuration': 20, '01$02$SamplingFrequency': 512, '01$02$EEGGround': 'Fpz',
+        '02$EEGReference': 'Fz', '02$SamplingFrequency': 256, '02$RecordingDuration': 10, '02$EEGGround': 'AFz',
+        '02$01$eeg/d.set$Manufacturer': 'X', '02$01$eeg/e.set$Manufacturer': 'Y'}
+    assert task.field('EEGReference', '02') == 'Fz'
+
+
+def test_tasks_are_consolidated_separately():
+    # the same scans of another task, whose fields are the same everywhere, are consolidated up to the project
+    uniform = {path: {'SamplingFrequency': 256, 'PowerLineFrequency': 60, 'EEGReference': 'Cz',
+                      'RecordingDuration': 10} for path in scan_fields}
+    rest, oddball = _task(scan_fields), _task(uniform)
+
+    assert list(oddball.get_fields().items()) == [
+        ('TaskName', 'rest'), ('EEGReference', 'Cz'), ('SamplingFrequency', 256), ('PowerLineFrequency', 60),
+        ('CapManufacturer', 'EGI'), ('RecordingDuration', 10), ('HeadCircumference', 56)]
+    assert oddball.get_fields('01') == dict()
+    assert oddball.get_fields('02') == {'EEGGround': 'AFz'}
+    assert oddball.get_fields('01', '01') == {'EEGGround': 'AFz'}
+    assert oddball.get_fields('01', '02') == {'EEGGround': 'Fpz'}
+    assert all(oddball.get_fields(*path) == dict() for path in scan_fields)
+
+    assert 'EEGReference' not in rest.get_fields()
+    assert rest.get_fields('02')['EEGReference'] == 'Fz'
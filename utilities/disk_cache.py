@@ -0,0 +1,97 @@
+"""
+This module defines DiskCache, a persistent cache used to skip expensive work across converter runs.
+"""
+
+import hashlib
+import os
+import os.path
+import pickle
+import tempfile
+
+__all__ = ['DiskCache', 'default_cache_path']
+
+default_cache_path = os.path.join(os.path.expanduser('~'), '.cache', 'ess2bids')
+
+
+class DiskCache:
+    """
+    Size-bounded cache of pickled values, stored as one file per entry.
+
+    * Keys are any tuple of values that have a stable repr(), and are hashed into the entry's filename
+    * Reading an entry refreshes its modification time, which is used to evict the least recently used entries
+      once the total size of the cache exceeds max_size
+    * Entries are written atomically, so several converters may share the same cache directory
+
+    Attributes:
+        path: directory containing the cache entries
+        max_size: maximum size of the cache in bytes
+    """
+
+    def __init__(self, path, max_size=64 * 1024 * 1024):
+        self.path = path
+        self.max_size = max_size
+
+    def get(self, key, default=None):
+        """
+        Fetches an entry from the cache
+
+        :param key: key of the entry
+        :param default: returned if the entry doesn't exist, or can't be read
+        :return: the cached value
+        """
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, 'rb') as f:
+                entry_key, value = pickle.load(f)
+            os.utime(entry_path)
+        except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError, AttributeError, ImportError):
+            return default
+        return value if entry_key == key else default
+
+    def put(self, key, value):
+        """
+        Stores an entry in the cache, evicting the least recently used entries if the cache becomes too large
+
+        * Failures to write the entry are ignored, since the cache is only an optimization
+
+        :param key: key of the entry
+        :param value: picklable value of the entry
+        :return:
+        """
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            handle, temp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+            try:
+                with os.fdopen(handle, 'wb') as f:
+                    pickle.dump((key, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(temp_path, self._entry_path(key))
+            except BaseException:
+                os.remove(temp_path)
+                raise
+        except (OSError, pickle.PicklingError, TypeError, AttributeError):
+            return
+        self._evict()
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, hashlib.sha1(repr(key).encode('utf-8')).hexdigest() + '.pickle')
+
+    def _evict(self):
+        entries = list()
+        total_size = 0
+        for entry in os.scandir(self.path):
+            if entry.name.endswith('.pickle'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_size += stat.st_size
+
+        for _, size, entry_path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(entry_path)
+            except OSError:
+                pass
+            total_size -= size
@@ -0,0 +1,193 @@
+"""
+This module defines the backends used to extract the channel locations of recordings in an ESS study.
+
+* 'matlab' loads each recording through EEGLAB, on a pool of Matlab engines
+* 'native' reads the channel locations straight from the header of each '.set' file
+* 'fake' never touches the recordings, and synthesizes deterministic channel locations from the
+  recording parameter sets in 'study_description.xml'. It's meant for tests and benchmarks.
+"""
+
+import io
+import math
+
+from abc import ABC, abstractmethod
+
+from utilities.matlab_instance import (MatlabStartupError, create_matlab_instance, get_matlab_pool,
+                                       teardown_matlab_instance)
+from utilities.set_reader import read_channel_locations
+
+__all__ = ['ChannelExtractor', 'MatlabChannelExtractor', 'NativeChannelExtractor', 'FakeChannelExtractor',
+           'extractor_names', 'create_extractor']
+
+
+class ChannelExtractor(ABC):
+    """
+    Interface shared by every channel extraction backend
+
+    * extract() receives every recording needed by a study at once, so a backend is free to batch or parallelize
+
+    Attributes:
+        name: name used to select the backend, also used to keep cached channels of different backends apart
+        cacheable: whether extracted channels may be stored in a persistent cache
+    """
+
+    name = None
+    cacheable = True
+
+    def start(self):
+        """
+        Starts loading whatever the backend needs to extract channels in the background, and returns immediately
+
+        * Called as soon as some recordings are known to need extracting, so that loading overlaps with whatever is
+          done before extract() is called. Calling it more than once has no effect
+
+        :return:
+        """
+        pass
+
+    @abstractmethod
+    def extract(self, requests, rec_parameter_sets):
+        """
+        Extracts the channel locations of several recordings
+
+        :param requests: Dictionary of recording parameter set labels, each mapped to a (filename, directory) pair
+        :param rec_parameter_sets: Recording parameter sets from 'study_description.xml', each mapped by label
+        :return: Dictionary of recording parameter set labels, each mapped to lists of labels, types, X, Y, and Z
+        """
+        pass
+
+    def close(self):
+        """
+        Releases any resource held by the backend
+
+        :return:
+        """
+        pass
+
+
+class MatlabChannelExtractor(ChannelExtractor):
+    """
+    Extracts channels by running 'ExtractChannelsBatch.m' on a pool of Matlab engines
+
+    * If eeglab_path is provided, the pool starts loading in the background once start() (or extract()) is called,
+      so a study whose channels are all cached never starts Matlab. Otherwise, the pool started by
+      create_matlab_instance() is used
+    * Recordings are split evenly across the pool, and each engine extracts its share in a single call
+    * Raises a MatlabStartupError if there are recordings to extract, but no pool to extract them with
+    """
+
+    name = 'matlab'
+
+    def __init__(self, eeglab_path=None, pool_size=1, verbose=False):
+        self.eeglab_path = eeglab_path
+        self.pool_size = pool_size
+        self.verbose = verbose
+
+    def start(self):
+        if self.eeglab_path:
+            create_matlab_instance(self.eeglab_path, verbose=self.verbose, pool_size=self.pool_size)
+
+    def extract(self, requests, rec_parameter_sets):
+        self.start()
+        rps_labels = list(requests)
+        matlab_pool = get_matlab_pool()
+        if rps_labels and not matlab_pool:
+            raise MatlabStartupError("No Matlab engine was started. Check your EEGLAB installation path in "
+                                     "'config.json'")
+        batches = list()
+
+        for i, matlab_instance in enumerate(matlab_pool):
+            batch = rps_labels[i::len(matlab_pool)]
+            if not batch:
+                continue
+            matlab_out = io.StringIO()
+            matlab_err = io.StringIO()
+            future = matlab_instance.ExtractChannelsBatch([requests[rps_label][0] for rps_label in batch],
+                                                          [requests[rps_label][1] for rps_label in batch],
+                                                          nargout=5, background=True, stdout=matlab_out,
+                                                          stderr=matlab_err)
+            batches.append((batch, future, matlab_out, matlab_err))
+
+        rps_entries = dict()
+        for batch, future, matlab_out, matlab_err in batches:
+            batch_entries = future.result()
+            for i, rps_label in enumerate(batch):
+                rps_entries[rps_label] = [list(column[i]) for column in batch_entries]
+            if self.verbose:
+                print(matlab_out.getvalue())
+                print(matlab_err.getvalue())
+
+        return rps_entries
+
+    def close(self):
+        teardown_matlab_instance()
+
+
+class NativeChannelExtractor(ChannelExtractor):
+    """
+    Extracts channels by reading the MAT-file header of each '.set' file, see utilities.set_reader
+    """
+
+    name = 'native'
+
+    def extract(self, requests, rec_parameter_sets):
+        return {rps_label: list(read_channel_locations(filename, directory))
+                for rps_label, (filename, directory) in requests.items()}
+
+
+class FakeChannelExtractor(ChannelExtractor):
+    """
+    Synthesizes channels from the recording parameter sets described in 'study_description.xml'
+
+    * Every channel label of every modality is returned in order, non-scalp channels having the type 'MISC', so they
+      are left out of the electrodes like those extracted by the other backends
+    * Scalp channels are evenly spaced on a circle, so the same study always produces the same electrodes
+    """
+
+    name = 'fake'
+    cacheable = False
+
+    def __init__(self, radius=85.0):
+        self.radius = radius
+
+    def extract(self, requests, rec_parameter_sets):
+        rps_entries = dict()
+
+        for rps_label in requests:
+            labels, types = list(), list()
+            for modality, mode in (rec_parameter_sets.get(rps_label) or dict()).items():
+                for channel in mode['Channel Labels']:
+                    labels.append(channel)
+                    types.append('MISC' if channel in mode['Non-Scalp Channel Labels'] else modality.upper())
+
+            angles = [2 * math.pi * i / max(len(labels), 1) for i in range(len(labels))]
+            rps_entries[rps_label] = [labels, types,
+                                      [round(self.radius * math.cos(angle), 4) + 0.0 for angle in angles],
+                                      [round(self.radius * math.sin(angle), 4) + 0.0 for angle in angles],
+                                      [0.0] * len(labels)]
+
+        return rps_entries
+
+
+extractor_names = (MatlabChannelExtractor.name, NativeChannelExtractor.name, FakeChannelExtractor.name)
+
+
+def create_extractor(name, config=None, pool_size=1, verbose=False):
+    """
+    Creates a channel extraction backend from its name
+
+    :raises ValueError: if the name doesn't match any backend
+
+    :param name: One of the names in extractor_names
+    :param config: Contents of 'config.json', which provides 'eeglab_path' for the Matlab backend
+    :param pool_size: Number of Matlab engines started by the Matlab backend
+    :param verbose: If set to True, the Matlab backend sends EEGLAB's output to standard out
+    :return: The created ChannelExtractor
+    """
+    if name == MatlabChannelExtractor.name:
+        return MatlabChannelExtractor((config or dict()).get('eeglab_path'), pool_size=pool_size, verbose=verbose)
+    elif name == NativeChannelExtractor.name:
+        return NativeChannelExtractor()
+    elif name == FakeChannelExtractor.name:
+        return FakeChannelExtractor()
+    raise ValueError("Unknown channel extractor '%s'" % name)
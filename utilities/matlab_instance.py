@@ -1,39 +1,115 @@
-from matlab.engine import start_matlab
 import io
 import os
 import os.path
 
-__matlab_instance = None
+from concurrent.futures import ThreadPoolExecutor
 
+__matlab_futures = list()
 
-def create_matlab_instance(eeglab_path, verbose=False):
-    global __matlab_instance
+
+class MatlabStartupError(Exception):
+    """
+    Exception that is thrown if the Matlab engine, or EEGLAB within it, failed to start
+    """
+
+
+def create_matlab_instance(eeglab_path, verbose=False, pool_size=1):
+    """
+    Starts loading a pool of Matlab engines with EEGLAB in background threads, and returns immediately.
+
+    * Startup overlaps with whatever the caller does next, and is only waited on by get_matlab_instance()
+      or get_matlab_pool()
+    * Any startup failure is raised as a MatlabStartupError once the engines are waited on
+    * Each engine is a separate Matlab process, so a pool can run that many calls concurrently
+
+    :param eeglab_path: Installation path of EEGLAB
+    :param verbose: If set to True, EEGLAB's output is sent to standard out
+    :param pool_size: Number of engines to start
+    :return:
+    """
+    if not __matlab_futures:
+        executor = ThreadPoolExecutor(max_workers=max(pool_size, 1))
+        for _ in range(max(pool_size, 1)):
+            __matlab_futures.append(executor.submit(_start_matlab_instance, eeglab_path, verbose))
+        executor.shutdown(wait=False)
+
+
+def _start_matlab_instance(eeglab_path, verbose):
     matlab_out = io.StringIO()
     matlab_err = io.StringIO()
 
-    if not __matlab_instance:
-        print('Loading Matlab engine...')
+    try:
+        from matlab.engine import start_matlab, EngineError, MatlabExecutionError
+    except ImportError:
+        raise MatlabStartupError("Unable to start Matlab engine. Did you install 'matlabengineforpython'?")
+
+    print('Loading Matlab engine...')
+
+    try:
+        matlab_instance = start_matlab("-nosplash")
+    except EngineError:
+        raise MatlabStartupError("Unable to start Matlab engine. Did you install 'matlabengineforpython'?")
 
-        __matlab_instance = start_matlab("-nosplash")
+    try:
+        matlab_instance.addpath(eeglab_path)
+    except Exception:
+        matlab_instance.quit()
+        raise MatlabStartupError("Error importing EEGLAB. Check your EEGLAB installation path in 'config.json'")
+    matlab_instance.addpath(os.path.join(os.path.dirname(os.path.abspath(__file__))), 'ess')
 
-        try:
-            __matlab_instance.addpath(eeglab_path)
-        except Exception as e:
-            print("Error importing EEGLAB. Check your EEGLAB installation path in 'config.json'")
-            raise e
-        __matlab_instance.addpath(os.path.join(os.path.dirname(os.path.abspath(__file__))), 'ess')
+    print('Loading EEGLAB...')
 
-        print('Loading EEGLAB...')
+    try:
+        matlab_instance.eeglab(stdout=matlab_out, stderr=matlab_err)
+    except MatlabExecutionError:
+        matlab_instance.quit()
+        raise MatlabStartupError("Failed to call 'eeglab()'. Check 'config.json' to make sure your EEGLAB "
+                                 "installation path is correct.")
+    if verbose:
+        print(matlab_out.getvalue())
+        print(matlab_err.getvalue())
 
-        __matlab_instance.eeglab(stdout=matlab_out, stderr=matlab_err)
-        if verbose:
-            print(matlab_out.getvalue())
-            print(matlab_err.getvalue())
+    return matlab_instance
 
 
 def get_matlab_instance():
-    return __matlab_instance
+    """
+    Fetches the first Matlab engine of the pool, waiting for it to finish starting if needed
+
+    :raises MatlabStartupError: if the engine failed to start
+    :return: The Matlab engine, or None if create_matlab_instance() was never called
+    """
+    if not __matlab_futures:
+        return None
+    return __matlab_futures[0].result()
+
+
+def get_matlab_pool():
+    """
+    Fetches every Matlab engine of the pool, waiting for them to finish starting if needed
+
+    :raises MatlabStartupError: if any engine failed to start
+    :return: List of Matlab engines, which is empty if create_matlab_instance() was never called
+    """
+    return [future.result() for future in __matlab_futures]
 
 
 def teardown_matlab_instance():
-    __matlab_instance.quit()
+    """
+    Shuts down every Matlab engine of the pool, without waiting for engines that are still starting
+
+    * Engines that haven't started loading are cancelled. Engines that are still loading are shut down as soon as
+      they finish, from their background thread
+
+    :return:
+    """
+    for future in __matlab_futures:
+        if not future.cancel():
+            future.add_done_callback(_quit_matlab_instance)
+    __matlab_futures.clear()
+
+
+def _quit_matlab_instance(future):
+    if future.exception() is None:
+        future.result().quit()
+
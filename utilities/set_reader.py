@@ -0,0 +1,381 @@
+"""
+This module contains a pure-Python reader for the channel locations stored in EEGLAB '.set' files.
+
+Only the 'chanlocs' structure of a recording is decoded. Every other variable (most notably the sample data) is
+skipped by its element size without being parsed, making this a cheap alternative to loading the whole recording
+through MATLAB and 'pop_loadset'.
+
+* MAT-file v5/v7 layouts (the EEGLAB default) are read natively
+* MAT-file v7.3 layouts are stored as HDF5, and require 'h5py' to be installed
+"""
+
+import os.path
+import struct
+import zlib
+
+__all__ = ['read_channel_locations', 'SetFileError']
+
+# MAT-file v5 data types
+_MI_UINT16 = 4
+_MI_MATRIX = 14
+_MI_COMPRESSED = 15
+_MI_UTF8 = 16
+_MI_UTF16 = 17
+_MI_UTF32 = 18
+
+_numeric_formats = {1: 'b', 2: 'B', 3: 'h', 4: 'H', 5: 'i', 6: 'I', 7: 'f', 9: 'd', 12: 'q', 13: 'Q'}
+
+# MAT-file v5 array classes
+_MX_CELL = 1
+_MX_STRUCT = 2
+_MX_CHAR = 4
+_MX_NUMERIC = range(6, 16)
+
+_chanloc_fields = ('labels', 'type', 'X', 'Y', 'Z')
+_chanloc_selection = {field: None for field in _chanloc_fields}
+
+_chunk_size = 1 << 20
+
+
+class SetFileError(IOError):
+    """
+    Exception that is thrown if the channel locations of a '.set' file can't be read
+    """
+
+
+def read_channel_locations(filename, path):
+    """
+    Reads the channel locations of an EEGLAB '.set' file, without loading its sample data.
+
+    * The return value mirrors the first five outputs of 'ExtractChannels.m'
+    * Missing channel types are returned as empty strings, and missing coordinates are returned as 'n/a'
+
+    :raises SetFileError: if the file isn't a MAT-file, or doesn't contain 'chanlocs'
+
+    :param filename: Name of the '.set' file
+    :param path: Directory containing the '.set' file
+    :return: Tuple of lists (labels, types, X, Y, Z), one entry per channel
+    """
+    full_path = os.path.join(path, filename)
+
+    with open(full_path, 'rb') as f:
+        header = f.read(128)
+        if len(header) < 128 or not header.startswith(b'MATLAB'):
+            raise SetFileError("%s is not a MAT-file" % full_path)
+        is_hdf5 = header[124:126] in (b'\x00\x02', b'\x02\x00')
+        if not is_hdf5:
+            chanlocs = _read_v5(f, header, full_path)
+
+    if is_hdf5:
+        chanlocs = _read_hdf5(full_path)
+
+    if chanlocs is None:
+        raise SetFileError("%s doesn't contain 'chanlocs'" % full_path)
+
+    labels, types, x, y, z = list(), list(), list(), list(), list()
+    for channel in chanlocs:
+        labels.append(_as_text(channel.get('labels')))
+        types.append(_as_text(channel.get('type')))
+        x.append(_as_coordinate(channel.get('X')))
+        y.append(_as_coordinate(channel.get('Y')))
+        z.append(_as_coordinate(channel.get('Z')))
+
+    return labels, types, x, y, z
+
+
+def _as_text(value):
+    return value if isinstance(value, str) else ''
+
+
+def _as_coordinate(value):
+    if isinstance(value, list):
+        value = value[0] if len(value) == 1 else None
+    return float(value) if isinstance(value, (int, float)) else 'n/a'
+
+
+class _FileStream:
+    """
+    Sequential view over the uncompressed part of a MAT-file
+    """
+
+    def __init__(self, f):
+        self._f = f
+        self.position = 0
+
+    def read(self, n):
+        data = self._f.read(n)
+        if len(data) != n:
+            raise SetFileError("Unexpected end of file")
+        self.position += n
+        return data
+
+    def skip(self, n):
+        self._f.seek(n, 1)
+        self.position += n
+
+
+class _InflateStream:
+    """
+    Sequential view over a compressed MAT-file element, which is only decompressed as far as it's read
+    """
+
+    def __init__(self, f, compressed_size):
+        self._f = f
+        self._remaining = compressed_size
+        self._inflater = zlib.decompressobj()
+        self._buffer = b''
+        self.position = 0
+
+    def _next_chunk(self):
+        while True:
+            if self._inflater.unconsumed_tail:
+                chunk = self._inflater.decompress(self._inflater.unconsumed_tail, _chunk_size)
+            elif self._remaining > 0:
+                raw = self._f.read(min(_chunk_size, self._remaining))
+                if not raw:
+                    raise SetFileError("Unexpected end of file")
+                self._remaining -= len(raw)
+                chunk = self._inflater.decompress(raw, _chunk_size)
+            else:
+                raise SetFileError("Unexpected end of compressed element")
+            if chunk:
+                return chunk
+
+    def read(self, n):
+        while len(self._buffer) < n:
+            self._buffer += self._next_chunk()
+        data, self._buffer = self._buffer[:n], self._buffer[n:]
+        self.position += n
+        return data
+
+    def skip(self, n):
+        self.position += n
+        if n <= len(self._buffer):
+            self._buffer = self._buffer[n:]
+            return
+        n -= len(self._buffer)
+        self._buffer = b''
+        while n > 0:
+            chunk = self._next_chunk()
+            if len(chunk) > n:
+                self._buffer = chunk[n:]
+            n -= len(chunk)
+
+
+def _read_v5(f, header, full_path):
+    if header[126:128] == b'IM':
+        byte_order = '<'
+    elif header[126:128] == b'MI':
+        byte_order = '>'
+    else:
+        raise SetFileError("%s has an unknown byte order" % full_path)
+
+    f.seek(0, os.SEEK_END)
+    end = f.tell()
+    offset = 128
+
+    # top-level variables that aren't needed are skipped by seeking past them, without decompressing them
+    while offset + 8 <= end:
+        f.seek(offset)
+        data_type, nbytes = struct.unpack(byte_order + 'II', f.read(8))
+
+        if data_type == _MI_COMPRESSED:
+            next_offset = offset + 8 + nbytes
+            stream = _InflateStream(f, nbytes)
+            data_type, nbytes = struct.unpack(byte_order + 'II', stream.read(8))
+        else:
+            next_offset = offset + 8 + _padded(nbytes)
+            stream = _FileStream(f)
+
+        if data_type == _MI_MATRIX:
+            chanlocs = _read_variable(stream, nbytes, byte_order)
+            if chanlocs is not None:
+                return chanlocs
+        offset = next_offset
+
+    return None
+
+
+def _read_variable(stream, nbytes, byte_order):
+    """
+    Reads 'chanlocs' from a top-level variable, which is either 'chanlocs' itself, or the 'EEG' structure
+
+    :return: list of channel dictionaries, or None if the variable doesn't contain 'chanlocs'
+    """
+    if nbytes == 0:
+        return None
+    array_class, dims, name = _read_array_header(stream, byte_order)
+
+    if array_class != _MX_STRUCT:
+        return None
+    if name == 'chanlocs':
+        return _read_array_data(stream, array_class, dims, byte_order, _chanloc_selection)
+    if name == 'EEG' and _prod(dims) == 1:
+        for field in _read_field_names(stream, byte_order):
+            data_type, field_bytes = _read_tag(stream, byte_order)
+            if field == 'chanlocs':
+                return _read_matrix(stream, field_bytes, byte_order, _chanloc_selection) or list()
+            stream.skip(_padded(field_bytes))
+    return None
+
+
+def _padded(nbytes):
+    return (nbytes + 7) & ~7
+
+
+def _prod(dims):
+    count = 1
+    for dim in dims:
+        count *= dim
+    return count
+
+
+def _read_tag(stream, byte_order):
+    return struct.unpack(byte_order + 'II', stream.read(8))
+
+
+def _read_element(stream, byte_order):
+    """
+    Reads a non-matrix data element, including its padding
+
+    :return: Tuple of the element's data type and its raw data
+    """
+    tag = stream.read(8)
+    data_type, nbytes = struct.unpack(byte_order + 'II', tag)
+    if data_type >> 16:
+        # small data element, packed into the tag itself
+        return data_type & 0xFFFF, tag[4:4 + (data_type >> 16)]
+    data = stream.read(nbytes)
+    stream.skip(_padded(nbytes) - nbytes)
+    return data_type, data
+
+
+def _read_array_header(stream, byte_order):
+    _, flags = _read_element(stream, byte_order)
+    _, dims = _read_element(stream, byte_order)
+    _, name = _read_element(stream, byte_order)
+
+    array_class = struct.unpack(byte_order + 'I', flags[:4])[0] & 0xFF
+    dims = struct.unpack(byte_order + '%di' % (len(dims) // 4), dims)
+    return array_class, dims, name.decode('ascii', errors='replace')
+
+
+def _read_field_names(stream, byte_order):
+    _, length = _read_element(stream, byte_order)
+    _, names = _read_element(stream, byte_order)
+
+    length = struct.unpack(byte_order + 'i', length[:4])[0]
+    return [names[i:i + length].split(b'\x00', 1)[0].decode('ascii', errors='replace')
+            for i in range(0, len(names), length)]
+
+
+def _read_matrix(stream, nbytes, byte_order, selection=None):
+    """
+    Reads the data of a miMATRIX element, whose tag has already been read
+
+    :param selection: If specified, maps the struct fields that are decoded to the selection used for their values.
+                      Any other field is skipped.
+    :return: The decoded value, or None if the matrix is empty or of an unsupported class
+    """
+    if nbytes == 0:
+        return None
+    end = stream.position + _padded(nbytes)
+    array_class, dims, _ = _read_array_header(stream, byte_order)
+    value = _read_array_data(stream, array_class, dims, byte_order, selection)
+    stream.skip(end - stream.position)
+    return value
+
+
+def _read_array_data(stream, array_class, dims, byte_order, selection=None):
+    count = _prod(dims)
+
+    if array_class == _MX_CHAR:
+        data_type, data = _read_element(stream, byte_order)
+        return _decode_chars(data_type, data, byte_order)
+
+    if array_class in _MX_NUMERIC:
+        data_type, data = _read_element(stream, byte_order)
+        number_format = _numeric_formats.get(data_type)
+        if number_format is None:
+            return None
+        return list(struct.unpack(byte_order + '%d%s' % (len(data) // struct.calcsize(number_format), number_format),
+                                  data))
+
+    if array_class == _MX_CELL:
+        cells = list()
+        for _ in range(count):
+            data_type, nbytes = _read_tag(stream, byte_order)
+            cells.append(_read_matrix(stream, nbytes, byte_order, selection))
+        return cells
+
+    if array_class == _MX_STRUCT:
+        field_names = _read_field_names(stream, byte_order)
+        rows = list()
+        for _ in range(count):
+            row = dict()
+            for field in field_names:
+                data_type, nbytes = _read_tag(stream, byte_order)
+                if selection is None or field in selection:
+                    row[field] = _read_matrix(stream, nbytes, byte_order, selection[field] if selection else None)
+                else:
+                    stream.skip(_padded(nbytes))
+            rows.append(row)
+        return rows
+
+    return None
+
+
+def _decode_chars(data_type, data, byte_order):
+    if data_type == _MI_UINT16:
+        return ''.join(map(chr, struct.unpack(byte_order + '%dH' % (len(data) // 2), data)))
+    if data_type == _MI_UTF8:
+        return data.decode('utf-8', errors='replace')
+    if data_type == _MI_UTF16:
+        return data.decode('utf-16-le' if byte_order == '<' else 'utf-16-be', errors='replace')
+    if data_type == _MI_UTF32:
+        return data.decode('utf-32-le' if byte_order == '<' else 'utf-32-be', errors='replace')
+    return data.decode('latin-1')
+
+
+def _read_hdf5(full_path):
+    try:
+        import h5py
+    except ImportError:
+        raise SetFileError("%s is a MAT-file v7.3, which requires 'h5py' to be read" % full_path)
+
+    with h5py.File(full_path, 'r') as f:
+        if 'chanlocs' in f:
+            group = f['chanlocs']
+        elif 'EEG' in f and 'chanlocs' in f['EEG']:
+            group = f['EEG']['chanlocs']
+        else:
+            return None
+
+        if group.attrs.get('MATLAB_empty') or not isinstance(group, h5py.Group):
+            return list()
+
+        columns = dict()
+        for field in _chanloc_fields:
+            if field not in group:
+                continue
+            dataset = group[field]
+            if h5py.check_dtype(ref=dataset.dtype):
+                # struct arrays store each field as an array of references, one per element
+                columns[field] = [_hdf5_value(f[ref]) for ref in dataset[()].flatten()]
+            else:
+                columns[field] = [_hdf5_value(dataset)]
+
+        return [{field: values[i] for field, values in columns.items() if i < len(values)}
+                for i in range(max(map(len, columns.values()), default=0))]
+
+
+def _hdf5_value(dataset):
+    matlab_class = dataset.attrs.get('MATLAB_class', b'')
+    if isinstance(matlab_class, bytes):
+        matlab_class = matlab_class.decode('ascii')
+
+    if dataset.attrs.get('MATLAB_empty'):
+        return '' if matlab_class == 'char' else None
+    if matlab_class == 'char':
+        return ''.join(map(chr, dataset[()].flatten(order='F')))
+    return [float(value) for value in dataset[()].flatten()]
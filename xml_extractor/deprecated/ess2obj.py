@@ -3,9 +3,22 @@ from xml_extractor.deprecated.ClassDef import *
 
 parser = etree.XMLParser(encoding='utf-8')
 
-def xml2sessionlist(xmlpath):  # opens xml at path and returns a list of session objects
+
+def parse_description(xmlpath):
+    # parses 'study_description.xml' once, so that its root can be shared by every xml2* function below
+    return etree.parse(xmlpath, parser).getroot()
+
+
+def _getroot(source):
+    # each xml2* function takes either the path of 'study_description.xml', or its already parsed root
+    if isinstance(source, etree._Element):
+        return source
+    return parse_description(source)
+
+
+def xml2sessionlist(xmlpath):  # opens xml at path (or takes its root) and returns a list of session objects
     # parse xml for sessions etree
-    etree_sessions = etree.parse(xmlpath, parser).getroot().find('sessions').findall('session')
+    etree_sessions = _getroot(xmlpath).find('sessions').findall('session')
 
     # turn the Element object into a list of sessions
     sessions = list()
@@ -58,7 +71,7 @@ def xml2sessionlist(xmlpath):  # opens xml at path and returns a list of session
 
 def xml2tasklist(xmlpath):
     # parse xml for tasks etree
-    etree_tasks = etree.parse(xmlpath, parser).getroot().find('tasks').findall('task')
+    etree_tasks = _getroot(xmlpath).find('tasks').findall('task')
 
     # make list
     tasks = list()
@@ -69,7 +82,7 @@ def xml2tasklist(xmlpath):
 
 def xml2eventcodelist(xmlpath):
     # parse xml for eventcodes etree
-    etree_eventcodes = etree.parse(xmlpath, parser).getroot().find('eventCodes').findall('eventCode')
+    etree_eventcodes = _getroot(xmlpath).find('eventCodes').findall('eventCode')
 
     eventcodes = list()
     for eventcode in etree_eventcodes:
@@ -93,7 +106,7 @@ def xml2eventcodelist(xmlpath):
 
 def xml2recparamsetlist(xmlpath):
     # parse xml for recparamsets etree
-    etree_recparamsets = etree.parse(xmlpath, parser).getroot().find('recordingParameterSets').findall('recordingParameterSet')
+    etree_recparamsets = _getroot(xmlpath).find('recordingParameterSets').findall('recordingParameterSet')
 
     recparamsets = list()
     for recparamset in etree_recparamsets:
@@ -128,7 +141,7 @@ def xml2head(xmlpath):
     """
     extract: title, description(notshort), project.funding.org, uuid, rooturi, summary.licence(concatenate the 3 things)
     """
-    headtree = etree.parse(xmlpath, parser).getroot()
+    headtree = _getroot(xmlpath)
 
     # extract each attribute
     title = headtree.find('title').text
@@ -1,18 +1,57 @@
 from lxml import etree
 
 
-def extract_description(xmlpath):
-    doc_root = etree.parse(xmlpath, etree.XMLParser(encoding='utf-8')).getroot()
-    description = dict()
+# version of the dictionaries returned by extract_description(). it must be increased whenever they change, since
+# they may be cached across runs
+extractor_version = 1
+
+# elements that are converted as soon as they're parsed, each mapped to the element that contains them
+_streamed_elements = {'session': 'sessions', 'task': 'tasks', 'recordingParameterSet': 'recordingParameterSets',
+                      'eventCode': 'eventCodes'}
 
-    description['head'] = _xml2head(doc_root)
-    description['sessions'] = _xml2sessions(doc_root.find('sessions').findall('session'))
-    description['tasks'] = _xml2tasks(doc_root.find('tasks').findall('task'))
-    description['rec_parameter_sets'] = _xml2recordingparametersets(
-        doc_root.find('recordingParameterSets').findall('recordingParameterSet'))
-    description['event_codes'] = _xml2eventcodes(doc_root.find('eventCodes').findall('eventCode'))
 
-    _scrub_na(description)
+def extract_description(xmlpath):
+    """
+    Extracts the contents of 'study_description.xml' into dictionaries
+
+    * The document is parsed incrementally. Each session, task, recording parameter set, and event code is converted
+      as soon as its element is parsed, then discarded, so the whole document is never held in memory at once
+    * "NA", "NaN" and empty values are replaced with 'n/a' as each element is converted
+
+    :raises OSError: if the file can't be read
+    :raises etree.XMLSyntaxError: if the file isn't well formed XML
+
+    :param xmlpath: Path of 'study_description.xml', or a binary file object it's read from
+    :return: Dictionary with the 'head', 'sessions', 'tasks', 'rec_parameter_sets' and 'event_codes' of the study
+    """
+    description = {'head': None, 'sessions': dict(), 'tasks': dict(), 'rec_parameter_sets': dict(),
+                   'event_codes': list()}
+
+    context = etree.iterparse(xmlpath, events=('end',), tag=tuple(_streamed_elements), encoding='utf-8')
+    for _, element in context:
+        parent = element.getparent()
+        if parent is None or parent.tag != _streamed_elements[element.tag]:
+            continue
+
+        if element.tag == 'session':
+            key, current_session = _xml2session(element)
+            description['sessions'].setdefault(key, list()).append(current_session)
+        elif element.tag == 'task':
+            key, current_task = _xml2task(element)
+            description['tasks'][key] = current_task
+        elif element.tag == 'recordingParameterSet':
+            key, current_rps = _xml2recordingparameterset(element)
+            description['rec_parameter_sets'][key] = current_rps
+        else:
+            description['event_codes'].append(_xml2eventcode(element))
+
+        # converted elements, and any element that preceded them, are no longer needed
+        element.clear()
+        while element.getprevious() is not None:
+            del parent[0]
+
+    description['head'] = _xml2head(context.root)
+    _scrub_na(description['head'])
     return description
 
 
@@ -36,26 +75,20 @@ def _xml2head(head):
     return header_dict
 
 
-def _xml2sessions(sessions):
-    # turn the Element object into a dict of sessions
-    sessions_dict = dict()
-    for session in sessions:
-        key = session.findtext('number')
-        if key not in sessions_dict:
-            sessions_dict[key] = list()
-        current_session = dict()
-
-        current_session['Task Label'] = session.findtext('taskLabel')
-        current_session['Lab ID'] = session.findtext('labId')
-        current_session['Subjects'] = _subjects_from_session_xml(session.findall('subject'))
+def _xml2session(session):
+    key = session.findtext('number')
+    current_session = dict()
 
-        current_session['Notes'] = ''
-        current_session['Data Recordings'] = \
-            _data_recordings_from_session_xml(session.find('dataRecordings').findall('dataRecording'))
+    current_session['Task Label'] = session.findtext('taskLabel')
+    current_session['Lab ID'] = session.findtext('labId')
+    current_session['Subjects'] = _subjects_from_session_xml(session.findall('subject'))
 
-        sessions_dict[key].append(current_session)
+    current_session['Notes'] = ''
+    current_session['Data Recordings'] = \
+        _data_recordings_from_session_xml(session.find('dataRecordings').findall('dataRecording'))
 
-    return sessions_dict
+    _scrub_na(current_session)
+    return key, current_session
 
 
 def _subjects_from_session_xml(subjects):
@@ -101,67 +134,64 @@ def _data_recordings_from_session_xml(data_recordings):
     return data_recordings_dict
 
 
-def _xml2tasks(tasks):
-    tasks_dict = dict()
-    for task in tasks:
-        key = task.findtext('taskLabel')
-        current_task = tasks_dict[key] = dict()
+def _xml2task(task):
+    key = task.findtext('taskLabel')
+    current_task = dict()
 
-        current_task['Description'] = task.findtext('description')
-        current_task['Tag'] = task.findtext('tag')
+    current_task['Description'] = task.findtext('description')
+    current_task['Tag'] = task.findtext('tag')
 
-    return tasks_dict
+    _scrub_na(current_task)
+    return key, current_task
 
 
-def _xml2recordingparametersets(rec_parameter_sets):
-    rps_dict = dict()
-    for rps in rec_parameter_sets:
-        key = rps.findtext('recordingParameterSetLabel')
-        current_rps = rps_dict[key] = dict()
+def _xml2recordingparameterset(rps):
+    label = rps.findtext('recordingParameterSetLabel')
+    current_rps = dict()
 
-        modalities = rps.find('channelType').findall('modality')
+    modalities = rps.find('channelType').findall('modality')
 
-        for modality in modalities:
-            key = modality.findtext('type')
-            current_mod = current_rps[key] = dict()
+    for modality in modalities:
+        key = modality.findtext('type')
+        current_mod = current_rps[key] = dict()
 
-            current_mod['Sampling Rate'] = modality.findtext('samplingRate')
-            current_mod['Name'] = modality.findtext('name')
-            current_mod['Description'] = modality.findtext('description')
-            current_mod['Start Channel'] = modality.findtext('startChannel')
-            current_mod['End Channel'] = modality.findtext('endChannel')
-            current_mod['Subject In-Session Number'] = modality.findtext('subjectInSessionNumber')
-            current_mod['Reference Location'] = modality.findtext('referenceLocation')
-            current_mod['Reference Label'] = modality.findtext('referenceLabel')
-            current_mod['Channel Location Type'] = modality.findtext('channelLocationType')
+        current_mod['Sampling Rate'] = modality.findtext('samplingRate')
+        current_mod['Name'] = modality.findtext('name')
+        current_mod['Description'] = modality.findtext('description')
+        current_mod['Start Channel'] = modality.findtext('startChannel')
+        current_mod['End Channel'] = modality.findtext('endChannel')
+        current_mod['Subject In-Session Number'] = modality.findtext('subjectInSessionNumber')
+        current_mod['Reference Location'] = modality.findtext('referenceLocation')
+        current_mod['Reference Label'] = modality.findtext('referenceLabel')
+        current_mod['Channel Location Type'] = modality.findtext('channelLocationType')
 
-            current_mod['Channel Labels'] = list(map(str.strip, modality.findtext('channelLabel').split(',')))
-            current_mod['Non-Scalp Channel Labels'] = \
-                list(map(str.strip, modality.findtext('nonScalpChannelLabel').split(',')))
+        current_mod['Channel Labels'] = list(map(str.strip, modality.findtext('channelLabel').split(',')))
+        current_mod['Non-Scalp Channel Labels'] = \
+            list(map(str.strip, modality.findtext('nonScalpChannelLabel').split(',')))
 
-    return rps_dict
+    _scrub_na(current_rps)
+    return label, current_rps
 
 
-def _xml2eventcodes(event_codes):
-    event_codes_list = list()  # iterated as list instead of dict to avoid indexing by both task label and event code
-    for event_code in event_codes:
-        current_event_code = dict()
-        event_codes_list.append(current_event_code)
+def _xml2eventcode(event_code):
+    # event codes are kept in a list instead of a dict to avoid indexing by both task label and event code
+    current_event_code = dict()
 
-        current_event_code['Code'] = event_code.findtext('code')
-        current_event_code['Task Label'] = event_code.findtext('taskLabel') or ''
+    current_event_code['Code'] = event_code.findtext('code')
+    current_event_code['Task Label'] = event_code.findtext('taskLabel') or ''
 
-        try:
-            current_event_code['No. instances'] = int(event_code.findtext('numberOfInstances'))
-        except AttributeError:
-            current_event_code['No. instances'] = 0
+    try:
+        current_event_code['No. instances'] = int(event_code.findtext('numberOfInstances'))
+    except AttributeError:
+        current_event_code['No. instances'] = 0
 
-        condition = event_code.find('condition')
-        current_event_code['HED Tag'] = condition.findtext('tag')
-        current_event_code['Label'] = condition.findtext('label')
-        current_event_code['Description'] = condition.findtext('description')
+    condition = event_code.find('condition')
+    current_event_code['HED Tag'] = condition.findtext('tag')
+    current_event_code['Label'] = condition.findtext('label')
+    current_event_code['Description'] = condition.findtext('description')
 
-    return event_codes_list
+    _scrub_na(current_event_code)
+    return current_event_code
 
 
 def _scrub_na(d):